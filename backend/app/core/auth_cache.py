@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.models.user import User
+
+# 認證的快速路徑（get_current_user 用）：
+# - token 快取：已驗證過簽章的 token -> user_id，TTL 不會超過 token 本身的 exp
+# - user 快取：user_id -> 身分（id / email），User 被更新或刪除時立刻失效（ORM event）
+# 兩者都是 process 內的 LRU；多個 worker 時，其他 worker 最多晚 AUTH_USER_CACHE_TTL_SECONDS 秒看到變更
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """已登入使用者的身分（不含密碼 hash，可以安全地放在快取裡）。"""
+
+    id: int
+    email: str
+
+
+_lock = threading.Lock()
+_tokens: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+_users: "OrderedDict[int, Tuple[AuthUser, float]]" = OrderedDict()
+_stats = {"token_hits": 0, "token_misses": 0, "user_hits": 0, "user_misses": 0}
+
+def _get(cache: OrderedDict, key, hit_stat: str, miss_stat: str):
+    now = time.monotonic()
+    with _lock:
+        entry = cache.get(key)
+        if entry is not None and entry[1] > now:
+            cache.move_to_end(key)
+            _stats[hit_stat] += 1
+            return entry[0]
+        if entry is not None:
+            del cache[key]
+        _stats[miss_stat] += 1
+    return None
+
+def _put(cache: OrderedDict, key, value, ttl: float, max_size: int) -> None:
+    if ttl <= 0 or max_size <= 0:
+        return
+    with _lock:
+        cache[key] = (value, time.monotonic() + ttl)
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+def get_token_user_id(token: str) -> Optional[int]:
+    return _get(_tokens, token, "token_hits", "token_misses")
+
+def put_token(token: str, user_id: int, exp: Optional[float]) -> None:
+    ttl = settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+    if exp is not None:
+        ttl = min(ttl, float(exp) - time.time())
+    _put(_tokens, token, user_id, ttl, settings.AUTH_TOKEN_CACHE_SIZE)
+
+def get_user(user_id: int) -> Optional[AuthUser]:
+    return _get(_users, user_id, "user_hits", "user_misses")
+
+def put_user(user: User) -> AuthUser:
+    identity = AuthUser(id=user.id, email=user.email)
+    _put(_users, user.id, identity, settings.AUTH_USER_CACHE_TTL_SECONDS, settings.AUTH_USER_CACHE_SIZE)
+    return identity
+
+def invalidate_user(user_id: int) -> None:
+    with _lock:
+        _users.pop(user_id, None)
+
+def clear() -> None:
+    with _lock:
+        _tokens.clear()
+        _users.clear()
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "tokens": len(_tokens), "users": len(_users)}
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_change(mapper, connection, target: User) -> None:
+    invalidate_user(target.id)
@@ -0,0 +1,155 @@
+import csv
+import io
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import false, func, literal_column, select, text, update
+from sqlalchemy.orm import Session
+
+from app.models.customer import Customer
+
+# API 匯入（app/core/importer.py）與 CLI（import_csv.py）共用的 bulk upsert 引擎
+# - Postgres + psycopg2：COPY FROM STDIN 進 temp staging table，再一條 INSERT ... SELECT ... ON CONFLICT 合併
+# - 其他（SQLite 等）：multi-row VALUES 的 INSERT ... ON CONFLICT，整批在同一個 transaction
+
+LOAD_COLUMNS = (
+    "customer_code", "last_visit_date", "total_spent", "visit_count", "membership_type", "created_at",
+    "risk_level", "risk_changes_on", "risk_version", "row_hash",
+)
+UPSERT_COLUMNS = (
+    "last_visit_date", "total_spent", "visit_count", "membership_type",
+    "risk_level", "risk_changes_on", "risk_version", "row_hash",
+)
+
+# 空字串要當成空字串（不是 NULL）寫入的文字欄位
+NOT_NULL_TEXT_COLUMNS = ("customer_code", "membership_type")
+
+
+class BulkLoader:
+    """load(rows) 寫入一批資料並回傳 (inserted, updated)；commit 由呼叫端決定。"""
+
+    # 建議的每批筆數（呼叫端用來切 batch）
+    batch_size = 5000
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load(self, rows: List[Dict]) -> Tuple[int, int]:
+        raise NotImplementedError
+
+
+class ValuesBulkLoader(BulkLoader):
+    """
+    multi-row INSERT ... ON CONFLICT DO UPDATE ... RETURNING <是否為新增>。
+    - Postgres：新插入的 tuple xmax = 0，被 ON CONFLICT 更新的 xmax 會是目前 transaction id
+    - SQLite：沒有 xmax；新 row 的 rowid 一定大於寫入前的 max(id)（max(id) 要在拿到 write lock 之後才讀）
+    """
+
+    def _stmt(self, max_id: Optional[int]):
+        if self.db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            inserted_flag = literal_column("(xmax = 0)")
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            inserted_flag = Customer.__table__.c.id > max_id
+
+        # 用 Core 的 Table 而不是 ORM entity：ORM bulk insert 會依「哪些欄位是 None」把 row 分組，
+        # risk_changes_on 有 None 有值時會被拆成大量小 INSERT
+        table = Customer.__table__
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.customer_code],
+            set_={c: stmt.excluded[c] for c in UPSERT_COLUMNS},
+        ).returning(inserted_flag.label("inserted"))
+
+    def load(self, rows: List[Dict]) -> Tuple[int, int]:
+        # 同一條 INSERT 裡同一個 code 不能出現兩次（Postgres 會報 "cannot affect row a second time"），
+        # 保留最後一筆；被蓋掉的前幾筆等同「更新」，計入 updated
+        latest = list({r["customer_code"]: r for r in rows}.values())
+
+        max_id = None
+        if self.db.get_bind().dialect.name != "postgresql":
+            # 先做一個不改資料的寫入拿到 SQLite 的 write lock（RESERVED，到 commit 才放），
+            # 之後別的連線插不進新 row，讀到的 max(id) 到這批 INSERT 為止都不會變
+            self.db.execute(update(Customer.__table__).where(false()).values(id=Customer.__table__.c.id))
+            max_id = self.db.scalar(select(func.coalesce(func.max(Customer.id), 0)))
+
+        # executemany + RETURNING：SQLAlchemy 的 insertmanyvalues 會自動拆成 multi-row VALUES
+        flags = self.db.execute(self._stmt(max_id), latest).scalars().all()
+        inserted = sum(1 for f in flags if f)
+        return inserted, len(rows) - inserted
+
+
+class PostgresCopyLoader(BulkLoader):
+    """COPY 進 temp table（不寫 WAL），再用一條 set-based INSERT ... SELECT 合併。"""
+
+    batch_size = 50000
+
+    STAGING_DDL = text("""
+        CREATE TEMP TABLE IF NOT EXISTS customers_staging (
+            seq BIGSERIAL,
+            customer_code VARCHAR(50),
+            last_visit_date DATE,
+            total_spent INTEGER,
+            visit_count INTEGER,
+            membership_type VARCHAR(50),
+            created_at TIMESTAMP,
+            risk_level VARCHAR(10),
+            risk_changes_on DATE,
+            risk_version VARCHAR(20),
+            row_hash VARCHAR(32)
+        ) ON COMMIT DELETE ROWS
+    """)
+
+    # DISTINCT ON 取檔案中同一 code 的最後一筆；xmax = 0 代表新增
+    MERGE_SQL = text("""
+        WITH merged AS (
+            INSERT INTO customers (customer_code, last_visit_date, total_spent, visit_count, membership_type, created_at,
+                                   risk_level, risk_changes_on, risk_version, row_hash)
+            SELECT DISTINCT ON (customer_code)
+                   customer_code, last_visit_date, total_spent, visit_count, membership_type, created_at,
+                   risk_level, risk_changes_on, risk_version, row_hash
+            FROM customers_staging
+            ORDER BY customer_code, seq DESC
+            ON CONFLICT (customer_code) DO UPDATE
+            SET last_visit_date = EXCLUDED.last_visit_date,
+                total_spent = EXCLUDED.total_spent,
+                visit_count = EXCLUDED.visit_count,
+                membership_type = EXCLUDED.membership_type,
+                risk_level = EXCLUDED.risk_level,
+                risk_changes_on = EXCLUDED.risk_changes_on,
+                risk_version = EXCLUDED.risk_version,
+                row_hash = EXCLUDED.row_hash
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted) FROM merged
+    """)
+
+    def load(self, rows: List[Dict]) -> Tuple[int, int]:
+        self.db.execute(self.STAGING_DDL)
+        self.db.execute(text("TRUNCATE customers_staging"))
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in rows:
+            writer.writerow([r[c] for c in LOAD_COLUMNS])
+        buf.seek(0)
+
+        # CSV 格式的 COPY 會把沒加引號的空字串讀成 NULL（None 也是寫成空字串，要保持 NULL）；
+        # 文字欄位用 FORCE_NOT_NULL 保留空字串，與 VALUES loader 的行為一致
+        raw = self.db.connection().connection
+        with raw.cursor() as cur:
+            cur.copy_expert(
+                f"COPY customers_staging ({', '.join(LOAD_COLUMNS)}) FROM STDIN "
+                f"WITH (FORMAT csv, FORCE_NOT_NULL ({', '.join(NOT_NULL_TEXT_COLUMNS)}))",
+                buf,
+            )
+
+        inserted = self.db.scalar(self.MERGE_SQL) or 0
+        return inserted, len(rows) - inserted
+
+
+def get_bulk_loader(db: Session) -> BulkLoader:
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql" and dialect.driver == "psycopg2":
+        return PostgresCopyLoader(db)
+    return ValuesBulkLoader(db)
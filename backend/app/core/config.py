@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
+from typing import Dict
 import os
 
 load_dotenv()
@@ -8,9 +9,56 @@ class Settings(BaseSettings):
     JWT_SECRET: str = "dev-secret-change-me"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
+    # 認證快取（見 app/core/auth_cache.py）
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300
+    AUTH_USER_CACHE_SIZE: int = 1000
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60
+    # 密碼 hash（見 app/core/passwords.py）；改 BCRYPT_ROUNDS 後，舊密碼會在下次登入時自動重算
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_PROCESSES: int = 2  # bcrypt 專用 process 數；0 = 不開 process pool，改用 threadpool
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # 排隊上限，超過回 503
     DATABASE_URL: str = "sqlite:///./app.db"
+    DB_ASYNC: bool = False  # true：API 請求改用 async engine（asyncpg / aiosqlite，見 app/core/db.py）
+    DATABASE_READ_URL: str = ""  # 唯讀 replica；設定後客戶列表 / 統計 / 匯出改讀 replica
+    # 連線池（見 app/core/db_pool.py）；primary / replica / async 各自一個 pool
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 10  # -1 = 不限
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # pool 滿了最多等多久拿連線
+    DB_POOL_RECYCLE_SECONDS: int = 300  # 連線最長壽命，防止被 Render 或 Supabase 單方面切斷
+    DB_POOL_PRE_PING: str = "idle"  # always | idle | never
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = 30.0  # idle 模式：閒置超過這麼久的連線 checkout 時才 ping
+    DB_CONNECT_TIMEOUT: int = 10  # 秒，應對跨區域延遲
+    DB_PGBOUNCER: bool = False  # 經過 transaction pooler（pgbouncer / Supabase :6543）時設 true
     CORS_ORIGINS: str = "http://localhost:5173"
+    LOG_LEVEL: str = "INFO"
     LLM_PROVIDER: str = "mock"
+    LLM_MAX_CONCURRENCY: int = 8  # 每個 process 同時送出的 LLM 請求數
+    LLM_BASE_URL: str = "https://api.openai.com/v1"  # OpenAI 相容端點（本地測試可指向 stub server）
+    LLM_API_KEY: str = ""
+    LLM_MODEL: str = "gpt-4o-mini"
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_MAX_RETRY_AFTER_SECONDS: float = 30.0  # 上游 Retry-After 超過這個值時只等這麼久
+    LLM_POOL_SIZE: int = 20  # keep-alive 連線池大小
+    LLM_RATE_LIMITS: Dict[str, float] = {}  # 每個 provider 每秒上限，例如 {"openai": 5}；沒列的不限速
+    SUGGESTION_CACHE_SIZE: int = 10000  # 跟進建議 L1 (LRU) 筆數
+    SUGGESTION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    SUGGESTION_DAYS_BUCKET: int = 7  # 快取 key 裡 days_since 的分桶天數
+    IMPORT_WORKERS: int = 2  # 背景匯入 worker 數
+    # 大型 CSV 的解析 process 數；1 = 不開 process pool（預設），0 = CPU 核心數
+    # 多核心解析依換行切檔，含雙引號的檔案一律改走單核心解析（見 app/core/parallel_csv.py）
+    IMPORT_PARSE_PROCESSES: int = 1
+    IMPORT_PREFETCH_BATCHES: int = 2  # 解析最多領先 DB 寫入幾批
+    IMPORT_PARALLEL_MIN_BYTES: int = 32 * 1024 * 1024  # 超過這個大小才用多核心解析
+    COUNT_CACHE_TTL_SECONDS: int = 60  # 客戶列表總數快取
+    # 流失風險規則（見 app/core/risk_rules.py）；改門檻時記得一起改 version
+    RISK_RULES_VERSION: str = "v1"
+    RISK_RULES: Dict[str, Dict[str, int]] = {
+        "default": {"medium": 60, "high": 120},
+        "VIP": {"medium": 90, "high": 150},
+    }
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.customer import Customer
+
+# list_customers 的總數快取：key = (membership_type, risk_level, 日期)
+# risk_level 每天會變，所以日期放進 key；匯入完成 / 風險 refresh 後整包清掉
+# 只存在 process 記憶體裡，其他 worker 最多晚 TTL 秒看到新數字
+
+logger = logging.getLogger(__name__)
+
+CountKey = Tuple[Optional[str], Optional[str], date]
+
+_lock = threading.Lock()
+_counts: Dict[CountKey, Tuple[int, float]] = {}
+
+def count_key(membership_type: Optional[str], risk_level: Optional[str]) -> CountKey:
+    return (membership_type or None, risk_level or None, date.today())
+
+def get_cached_count(key: CountKey, allow_stale: bool = False) -> Optional[int]:
+    with _lock:
+        hit = _counts.get(key)
+    if not hit:
+        return None
+    value, expires_at = hit
+    if allow_stale or time.monotonic() < expires_at:
+        return value
+    return None
+
+def set_cached_count(key: CountKey, value: int) -> None:
+    with _lock:
+        _counts[key] = (value, time.monotonic() + settings.COUNT_CACHE_TTL_SECONDS)
+
+def invalidate_counts() -> None:
+    with _lock:
+        _counts.clear()
+
+def estimate_count(db: Session, whereclause) -> Optional[int]:
+    """
+    不掃表的估計值（只有 Postgres 有統計資訊可用，其他 DB 回傳 None）：
+    - 沒有篩選：pg_class.reltuples
+    - 有篩選：planner 的 EXPLAIN 估計列數
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+
+    if whereclause is None:
+        est = db.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'customers'::regclass"))
+        # 從沒 ANALYZE 過的表 reltuples 是 -1
+        return int(est) if est is not None and est >= 0 else None
+
+    # render_postcompile：把 IN / NOT IN 的 expanding 參數展開成一般的 bind（否則 SQL 裡會留著 __[POSTCOMPILE_...]）
+    compiled = select(Customer.id).where(whereclause).compile(
+        dialect=bind.dialect, compile_kwargs={"render_postcompile": True},
+    )
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    try:
+        # savepoint：EXPLAIN 失敗不會讓整個 transaction 進入 aborted 狀態，呼叫端還能改算精確值
+        with db.begin_nested():
+            plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params).scalar()
+    except DBAPIError:
+        logger.warning("EXPLAIN estimate failed, falling back to exact count", exc_info=True)
+        return None
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,183 @@
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from app.models.customer import Customer
+from app.models.customer_stats import CustomerRollup
+
+# customer_rollup 的增量維護 + 讀取彙總
+# - 匯入：每批寫入前先查出被覆蓋的舊資料，扣掉舊的、加上新的（同一個 transaction）
+# - 風險 refresh：risk_level 變動的 row 從舊等級搬到新等級
+# - 整批重建：rebuild()（demo 資料、init_db 回填）
+# 百分位數由消費金額級距的直方圖估算，讀取成本只跟群組數有關，跟客戶數無關
+
+# total_spent 級距下界：bucket i = [SPENT_EDGES[i], SPENT_EDGES[i + 1])，最後一格無上限
+SPENT_EDGES = (0, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+
+# 距今幾個月（依最後來店月份）-> recency 區間
+RECENCY_BUCKETS = ((0, "0-1m"), (1, "1-3m"), (3, "3-6m"), (6, "6-12m"), (12, "12m+"))
+
+PERCENTILES = (50, 90)
+
+RollupKey = Tuple[str, str, date, int]
+
+# 彙總表的增量維護都是「先讀舊值、再套差異」，同時有兩個寫入者（兩個匯入 worker、API + CLI、匯入 + 風險 refresh）
+# 碰到同一個客戶就會把同一筆舊值扣兩次，彙總表從此對不上。所有寫入者都要在 rollup_writer() 裡做完到 commit：
+# - 同一個 process：_rollup_lock（RLock：refresh 可能在已經持有鎖的流程裡被呼叫）
+# - 跨 process：Postgres transaction 層級的 advisory lock，commit / rollback 時自動釋放
+_rollup_lock = threading.RLock()
+ROLLUP_ADVISORY_LOCK_ID = 0x52495348  # 任意固定值，只要不跟其他 advisory lock 撞到
+
+@contextmanager
+def rollup_writer(db: Session) -> Iterator[None]:
+    """在這個 with 裡讀舊值、寫入、套差異並 commit；要在第一個 SELECT 之前進來，才看得到前一個寫入者的結果。"""
+    with _rollup_lock:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ROLLUP_ADVISORY_LOCK_ID})
+        yield
+
+def spent_bucket(total_spent: int) -> int:
+    return max(bisect_right(SPENT_EDGES, total_spent or 0) - 1, 0)
+
+def rollup_key(membership_type: str, risk_level: str, last_visit_date: date, total_spent: int) -> RollupKey:
+    return (membership_type, risk_level, last_visit_date.replace(day=1), spent_bucket(total_spent))
+
+def recency_bucket(visit_month: date, today: date) -> str:
+    months_ago = (today.year * 12 + today.month) - (visit_month.year * 12 + visit_month.month)
+    label = RECENCY_BUCKETS[0][1]
+    for start, name in RECENCY_BUCKETS:
+        if months_ago >= start:
+            label = name
+    return label
+
+def apply_delta(
+    db: Session,
+    removed: Iterable[Tuple[str, Optional[str], date, int]],
+    added: Iterable[Tuple[str, Optional[str], date, int]],
+) -> None:
+    """
+    removed / added：(membership_type, risk_level, last_visit_date, total_spent)。
+    risk_level 為 None 的 row（還沒算過風險）不列入彙總。
+    """
+    delta: Dict[RollupKey, List[int]] = defaultdict(lambda: [0, 0])
+    for sign, rows in ((-1, removed), (1, added)):
+        for membership_type, risk_level, last_visit_date, total_spent in rows:
+            if risk_level is None:
+                continue
+            d = delta[rollup_key(membership_type, risk_level, last_visit_date, total_spent)]
+            d[0] += sign
+            d[1] += sign * (total_spent or 0)
+
+    params = [
+        {
+            "membership_type": k[0], "risk_level": k[1], "visit_month": k[2], "spent_bucket": k[3],
+            "customers": n, "total_spent": s,
+        }
+        for k, (n, s) in delta.items() if n or s
+    ]
+    if not params:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(CustomerRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            CustomerRollup.membership_type, CustomerRollup.risk_level,
+            CustomerRollup.visit_month, CustomerRollup.spent_bucket,
+        ],
+        set_={
+            "customers": CustomerRollup.customers + stmt.excluded.customers,
+            "total_spent": CustomerRollup.total_spent + stmt.excluded.total_spent,
+        },
+    )
+    db.execute(stmt, params)
+
+def record_upserts(db: Session, rows: Sequence[Dict]) -> None:
+    """匯入每批呼叫一次，必須在 bulk loader 寫入「之前」（才查得到被覆蓋的舊值），並在 rollup_writer() 裡面。"""
+    latest = {r["customer_code"]: r for r in rows}
+    codes = list(latest)
+    removed = []
+    # 分段查，避免一次塞太多 IN() 參數
+    for i in range(0, len(codes), 1000):
+        removed.extend(db.execute(
+            select(Customer.membership_type, Customer.risk_level, Customer.last_visit_date, Customer.total_spent)
+            .where(Customer.customer_code.in_(codes[i:i + 1000]))
+        ).all())
+    added = [
+        (r["membership_type"], r["risk_level"], r["last_visit_date"], r["total_spent"])
+        for r in latest.values()
+    ]
+    apply_delta(db, removed, added)
+
+def rebuild(db: Session, batch_size: int = 50000) -> None:
+    """從 customers 整張重算（不 commit）。"""
+    db.execute(delete(CustomerRollup))
+    result = db.execute(
+        select(Customer.membership_type, Customer.risk_level, Customer.last_visit_date, Customer.total_spent)
+        .execution_options(yield_per=batch_size)
+    )
+    for part in result.partitions():
+        apply_delta(db, (), part)
+
+def _percentile(hist: Dict[int, List[int]], total: int, pct: float) -> Optional[float]:
+    """由級距直方圖估計百分位數：在落點級距內線性內插。"""
+    if total <= 0:
+        return None
+    target = total * pct / 100
+    seen = 0
+    for b in sorted(hist):
+        n, s = hist[b]
+        if n <= 0:
+            continue
+        if seen + n >= target:
+            # 假設級距內均勻分布，上界取「能讓平均值吻合」的值（不超過級距上限；最後一格沒有上限）
+            lo = SPENT_EDGES[b]
+            hi = max(lo, 2 * s / n - lo)
+            if b + 1 < len(SPENT_EDGES):
+                hi = min(hi, SPENT_EDGES[b + 1])
+            return round(lo + (hi - lo) * (target - seen) / n, 2)
+        seen += n
+    return None
+
+def get_stats(db: Session, membership_type: Optional[str] = None, today: Optional[date] = None) -> Dict:
+    today = today or date.today()
+    query = select(CustomerRollup).where(CustomerRollup.customers > 0)
+    if membership_type:
+        query = query.where(CustomerRollup.membership_type == membership_type)
+
+    groups: Dict[Tuple[str, str, str], Dict] = {}
+    for r in db.scalars(query):
+        key = (r.membership_type, r.risk_level, recency_bucket(r.visit_month, today))
+        g = groups.setdefault(key, {"customers": 0, "total_spent": 0, "hist": defaultdict(lambda: [0, 0])})
+        g["customers"] += r.customers
+        g["total_spent"] += r.total_spent
+        h = g["hist"][r.spent_bucket]
+        h[0] += r.customers
+        h[1] += r.total_spent
+
+    out = []
+    for (m, risk, recency), g in sorted(groups.items()):
+        item = {
+            "membership_type": m,
+            "risk_level": risk,
+            "recency_bucket": recency,
+            "customers": g["customers"],
+            "total_spent": g["total_spent"],
+        }
+        for p in PERCENTILES:
+            item[f"spent_p{p}"] = _percentile(g["hist"], g["customers"], p)
+        out.append(item)
+    return {
+        "groups": out,
+        "total_customers": sum(g["customers"] for g in groups.values()),
+        "total_spent": sum(g["total_spent"] for g in groups.values()),
+    }
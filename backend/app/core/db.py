@@ -1,28 +1,139 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, TypeVar, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .config import settings
+from .db_pool import engine_options, instrument, pgbouncer_url
 
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
-else:
-    connect_args["connect_timeout"] = 10  # 增加連線超時時間（秒），應對跨區域延遲
-
-engine = create_engine(
-    settings.DATABASE_URL, 
-    connect_args=connect_args, 
-    pool_pre_ping=True,  # 在每次使用連線前先「戳」一下，確保連線還活著
-    pool_recycle=300,    # 每 5 分鐘強制重置連線，防止被 Render 或 Supabase 單方面切斷
-    future=True
+T = TypeVar("T")
+
+# 連線池大小 / pre-ping / pgbouncer 模式等設定見 app/core/db_pool.py
+engine = instrument(
+    create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, "primary")), "primary",
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+# 唯讀 replica（DATABASE_READ_URL）：客戶列表 / 統計 / 匯出這類 GET 走這裡；沒設定時就是 primary
+if settings.DATABASE_READ_URL:
+    read_engine = instrument(
+        create_engine(settings.DATABASE_READ_URL, **engine_options(settings.DATABASE_READ_URL, "replica")), "replica",
+    )
+    ReadSessionLocal = sessionmaker(
+        bind=read_engine, autoflush=False, autocommit=False, future=True, info={"replica": True},
+    )
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
+def is_replica(db: Session) -> bool:
+    """replica session 不能寫入（需要寫入的工作請改用 SessionLocal）。"""
+    return bool(db.info.get("replica"))
+
 class Base(DeclarativeBase):
     pass
 
+def missing_columns(bind) -> List[str]:
+    """
+    model 有、但 DB 裡既有的表沒有的欄位（"table.column"）。
+    create_all 只建新表、不會幫舊表補欄位，升級後要跑 scripts/init_db.py。
+    """
+    inspector = inspect(bind)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        missing += [f"{table.name}.{c.name}" for c in table.columns if c.name not in existing]
+    return missing
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+# ---- 非同步 engine（settings.DB_ASYNC=true 時啟用）----
+# 驅動由 DATABASE_URL 推出來：postgresql -> asyncpg、sqlite -> aiosqlite
+# router 的 DB 邏輯都寫成「吃 sync Session 的函式」，用 run_db() 執行：
+# - DB_ASYNC=false：丟到 threadpool 跑（原本的行為）
+# - DB_ASYNC=true：AsyncSession.run_sync() 直接在 event loop 上跑（I/O 不佔 thread），
+#   一個 worker 就能同時服務大量 DB-bound 請求
+# 匯入 / 匯出 / refresh 這類長時間的批次工作仍然用上面的 sync engine（在自己的 worker thread 裡）
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver for DATABASE_URL backend '{backend}'")
+    u = u.set(drivername=ASYNC_DRIVERS[backend])
+    if backend != "sqlite" and "sslmode" in u.query:
+        # asyncpg 不認得 libpq 的 sslmode，改成 ssl=
+        query = dict(u.query)
+        query["ssl"] = query.pop("sslmode")
+        u = u.set(query=query)
+    return u.render_as_string(hide_password=False)
+
+_async_engines: Dict[bool, Any] = {}
+_async_sessionmakers: Dict[bool, Any] = {}
+
+def get_async_sessionmaker(read: bool = False):
+    read = read and bool(settings.DATABASE_READ_URL)
+    if read not in _async_sessionmakers:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        name = "replica_async" if read else "primary_async"
+        url = pgbouncer_url(async_database_url(settings.DATABASE_READ_URL if read else settings.DATABASE_URL))
+        async_engine = create_async_engine(url, **engine_options(url, name, is_async=True))
+        instrument(async_engine.sync_engine, name)
+        _async_engines[read] = async_engine
+        # commit 後不 expire，避免在 run_sync 外讀屬性時觸發 lazy load
+        _async_sessionmakers[read] = async_sessionmaker(
+            async_engine, expire_on_commit=False, info={"replica": True} if read else {},
+        )
+    return _async_sessionmakers[read]
+
+@asynccontextmanager
+async def _open_session(read: bool):
+    if settings.DB_ASYNC:
+        async with get_async_sessionmaker(read)() as db:
+            yield db
+    else:
+        db = (ReadSessionLocal if read else SessionLocal)()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+async def get_session():
+    """
+    async router 用的 dependency：DB_ASYNC=true 給 AsyncSession，否則給一般的 Session。
+    搭配 run_db() 使用，不要直接在 event loop 上呼叫 sync Session 的方法。
+    """
+    async with _open_session(read=False) as db:
+        yield db
+
+async def get_read_session():
+    """同 get_session，但有設定 DATABASE_READ_URL 時連到 replica（只用在不寫入、可接受複寫延遲的 GET）。"""
+    async with _open_session(read=True) as db:
+        yield db
+
+async def run_db(db: Union[Session, Any], fn: Callable[..., T], *args, **kwargs) -> T:
+    """用 sync Session 執行 fn(session, *args)：async engine 走 run_sync，sync engine 走 threadpool。"""
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
+
+async def dispose_async_engine() -> None:
+    for async_engine in _async_engines.values():
+        await async_engine.dispose()
@@ -0,0 +1,179 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+# DB 連線池設定 + 監控（app/core/db.py 建 engine 時用）
+# - 大小 / overflow / timeout / recycle 都由 Settings 控制（DB_POOL_*）
+# - pre-ping 策略：always（每次 checkout 都 SELECT 1）、idle（閒置超過 DB_POOL_PRE_PING_IDLE_SECONDS 才 ping）、never
+#   跨區域連線每次多一個 round trip 很貴，預設 idle：剛歸還的熱連線直接用，放久的才檢查
+# - DB_PGBOUNCER=true：前面是 transaction pooler（pgbouncer / Supabase pooler）時，
+#   關掉 asyncpg 的 server-side prepared statements（連線會被其他 client 共用，prepared statement 不保證存在）；
+#   psycopg2 本來就不用 server-side prepared statements
+# - 每個 pool 記錄 checkout 等待時間（histogram）、timeout 次數；stats() 另外回傳目前使用量 / 飽和度
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+# checkout 等待時間的 histogram 上界（秒）
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_sum = 0.0
+        self.wait_seconds_max = 0.0
+        self.buckets = [0] * (len(CHECKOUT_BUCKETS) + 1)  # 最後一格是 +Inf
+
+    def observe(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_sum += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.buckets[bisect_left(CHECKOUT_BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_sum": self.wait_seconds_sum,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_seconds_buckets": list(self.buckets),
+            }
+
+
+_metrics: Dict[str, PoolMetrics] = {}
+_engines: Dict[str, Engine] = {}
+
+
+class _TimedPoolMixin:
+    """量 checkout 等待時間（包含 pool 滿了排隊、開新連線的時間）。pool 名稱用 logging_name 帶進來。"""
+
+    def _do_get(self):
+        metrics = _metrics.get(self._orig_logging_name)
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            if metrics:
+                metrics.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        if metrics:
+            metrics.observe(time.perf_counter() - start)
+        return conn
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_memory_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(url: str, name: str, is_async: bool = False) -> Dict[str, Any]:
+    """create_engine / create_async_engine 的參數（不含 URL）。"""
+    u = make_url(url)
+    sqlite = u.get_backend_name() == "sqlite"
+
+    connect_args: Dict[str, Any] = {}
+    if sqlite:
+        if not is_async:
+            connect_args["check_same_thread"] = False
+    elif is_async:
+        connect_args["timeout"] = settings.DB_CONNECT_TIMEOUT
+        if settings.DB_PGBOUNCER:
+            connect_args["statement_cache_size"] = 0
+            # 仍然需要的 unnamed prepare 用唯一名稱，避免撞到同一條 server 連線上其他 client 的
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    else:
+        connect_args["connect_timeout"] = settings.DB_CONNECT_TIMEOUT  # 應對跨區域延遲
+
+    options: Dict[str, Any] = {
+        "connect_args": connect_args,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING == "always",
+        "pool_logging_name": name,
+    }
+    if not _is_memory_sqlite(u):
+        # in-memory SQLite 用 SQLAlchemy 預設的單一連線 pool，其餘都是可調的 QueuePool
+        options.update(
+            poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,  # 防止被 Render 或 Supabase 單方面切斷
+            pool_use_lifo=True,  # 優先重用剛歸還的連線，閒置的多餘連線才會被 recycle 掉
+        )
+    return options
+
+def pgbouncer_url(url: str) -> str:
+    """transaction pooler 模式下關掉 asyncpg dialect 的 prepared statement 快取。"""
+    u = make_url(url)
+    if settings.DB_PGBOUNCER and u.drivername == "postgresql+asyncpg":
+        u = u.update_query_dict({"prepared_statement_cache_size": "0"})
+    return u.render_as_string(hide_password=False)
+
+def instrument(engine: Engine, name: str) -> Engine:
+    """登記 engine 給 stats() 用，並掛上 idle pre-ping。async engine 請傳 .sync_engine。"""
+    if settings.DB_POOL_PRE_PING not in PRE_PING_STRATEGIES:
+        raise RuntimeError(f"DB_POOL_PRE_PING must be one of {PRE_PING_STRATEGIES}")
+    _metrics.setdefault(name, PoolMetrics())
+    _engines[name] = engine
+
+    if settings.DB_POOL_PRE_PING == "idle":
+        idle_seconds = settings.DB_POOL_PRE_PING_IDLE_SECONDS
+
+        @event.listens_for(engine, "checkin")
+        def _on_checkin(dbapi_connection, record):
+            record.info["checked_in_at"] = time.monotonic()
+
+        @event.listens_for(engine, "checkout")
+        def _on_checkout(dbapi_connection, record, proxy):
+            checked_in_at = record.info.get("checked_in_at")
+            if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+                return
+            try:
+                engine.dialect.do_ping(dbapi_connection)
+            except Exception:
+                # pool 收到 DisconnectionError 會丟掉這條連線，改開新的重試
+                raise exc.DisconnectionError()
+
+    return engine
+
+def _pool_usage(engine: Engine) -> Dict[str, Optional[float]]:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"size": None, "checked_out": None, "overflow": None, "capacity": None, "saturation": None}
+    checked_out = pool.checkedout()
+    max_overflow = pool._max_overflow
+    capacity = pool.size() + max_overflow if max_overflow >= 0 else None
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "saturation": round(checked_out / capacity, 4) if capacity else None,
+    }
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """每個 pool 的 checkout 統計 + 目前使用量（saturation = checked_out / (pool_size + max_overflow)）。"""
+    return {
+        name: {**_metrics[name].snapshot(), **_pool_usage(engine)}
+        for name, engine in _engines.items()
+    }
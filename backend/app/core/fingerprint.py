@@ -0,0 +1,36 @@
+import hashlib
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.customer import Customer
+
+# 增量（delta）匯入用的 row 指紋：
+# - 每筆客戶資料的內容（最後來店日 / 消費 / 來店次數 / 會員等級）算一個 hash，跟著 upsert 存進 customers.row_hash
+# - delta 模式下每批先跟 DB 裡的 row_hash 比對，內容沒變的 row 不送進 bulk loader
+#   （不重寫 row、不動彙總表、不清建議快取），每天的全量快照匯入成本只跟「實際變動的筆數」有關
+# - 風險欄位由內容推導、每日 refresh 維護（app/core/risk.py），不列入指紋
+# row_hash 為 NULL（舊資料、demo 資料）一律視為有變動，第一次 delta 匯入會補上
+
+FINGERPRINT_COLUMNS = ("last_visit_date", "total_spent", "visit_count", "membership_type")
+
+def row_fingerprint(last_visit_date, total_spent: int, visit_count: int, membership_type: str) -> str:
+    data = f"{last_visit_date.isoformat()}\x1f{total_spent}\x1f{visit_count}\x1f{membership_type}"
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+def split_changed(db: Session, rows: Sequence[Dict]) -> Tuple[List[Dict], int]:
+    """
+    回傳 (要寫入的 row, 沒變的筆數)。
+    同一批裡同一個 code 出現多次時只留最後一筆（與 bulk loader 相同），被蓋掉的前幾筆不算在兩者裡。
+    """
+    latest = {r["customer_code"]: r for r in rows}
+    codes = list(latest)
+    existing: Dict[str, str] = {}
+    # 分段查，避免一次塞太多 IN() 參數
+    for i in range(0, len(codes), 1000):
+        existing.update(db.execute(
+            select(Customer.customer_code, Customer.row_hash).where(Customer.customer_code.in_(codes[i:i + 1000]))
+        ).all())
+    changed = [r for code, r in latest.items() if existing.get(code) != r["row_hash"]]
+    return changed, len(latest) - len(changed)
@@ -0,0 +1,352 @@
+import codecs
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.core.bulk_load import get_bulk_loader
+from app.core.columnar import ColumnarReader
+from app.core.config import settings
+from app.core import customer_stats, fingerprint, metrics, suggestion_cache
+from app.core.count_cache import invalidate_counts
+from app.core.db import SessionLocal
+from app.core.parallel_csv import ParallelCSVReader, has_quotes, parse_processes
+from app.core.risk import risk_fields
+from app.models.import_record import ImportRecord
+from app.schemas.customer import ImportResult
+
+# 每次從上傳檔讀取的位元組數、每批 upsert 的筆數（預設值，實際依 bulk loader 調整）
+# 兩者都固定，所以匯入時的記憶體用量不會隨檔案大小成長
+CHUNK_SIZE = 1024 * 1024
+BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+# 每批各階段花的時間（GET /api/metrics）：
+# read = 讀檔（CSV 單核心路徑）、parse = 解析 + 算風險（不含 read）、
+# wait = 寫入端等解析的時間（> 0 代表瓶頸在解析）、upsert = 彙總差異 + bulk load、commit = commit（含進度）
+import_stage_seconds = metrics.histogram(
+    "import_stage_seconds", "Import time per batch by stage", ("format", "stage"),
+)
+import_rows_total = metrics.counter("import_rows_total", "Rows written by imports", ("format",))
+import_rows_unchanged_total = metrics.counter(
+    "import_rows_unchanged_total", "Rows skipped by delta imports because their content did not change", ("format",),
+)
+import_duration_seconds = metrics.histogram(
+    "import_duration_seconds", "Wall time of whole imports", ("format", "status"),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+REQUIRED_COLUMNS = {
+    "customer_code",
+    "last_visit_date",
+    "total_spent",
+    "visit_count",
+    "membership_type",
+}
+
+def _to_int(v: str, field: str) -> int:
+    try:
+        return int(float(v))
+    except Exception:
+        if not v: return 0
+        raise HTTPException(status_code=422, detail=f"Invalid int for {field}: {v}")
+
+def _to_date(v: str, field: str) -> date:
+    try:
+        if not v: raise ValueError("Empty date")
+        return date.fromisoformat(v)
+    except Exception:
+        raise HTTPException(status_code=422, detail=f"Invalid date for {field} (YYYY-MM-DD): {v}")
+
+def iter_text_lines(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    分段讀取 bytes 並逐行吐出文字。
+    用 incremental decoder 處理跨 chunk 的多位元組字元與開頭的 BOM，
+    只保留「最後一個換行之後」的殘段在記憶體裡。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        final = not chunk
+        pending += decoder.decode(chunk, final=final)
+
+        cut = len(pending) if final else pending.rfind("\n") + 1
+        if cut:
+            block, pending = pending[:cut], pending[cut:]
+            yield from io.StringIO(block)
+        if final:
+            return
+
+def iter_customer_rows(lines: Iterable[str]) -> Iterator[Dict]:
+    """逐列解析 CSV，一次只產生一筆 row dict（generator，不會累積整份檔案）。"""
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames:
+        raise HTTPException(status_code=400, detail="CSV has no header")
+
+    now = datetime.utcnow()
+    today = now.date()
+    row_idx = 0
+    for row in reader:
+        row_idx += 1
+        code = row.get("customer_code") or row.get("customer_id")
+        if not code:
+            continue
+
+        membership_type = (row.get("membership_type") or "BASIC").strip()
+        last_visit_date = _to_date((row.get("last_visit_date") or "").strip(), f"Row {row_idx} date")
+        total_spent = _to_int((row.get("total_spent") or "").strip(), f"Row {row_idx} spent")
+        visit_count = _to_int((row.get("visit_count") or "").strip(), f"Row {row_idx} visit")
+        yield {
+            "customer_code": code.strip(),
+            "last_visit_date": last_visit_date,
+            "total_spent": total_spent,
+            "visit_count": visit_count,
+            "membership_type": membership_type,
+            "created_at": now,
+            **risk_fields(membership_type, last_visit_date, today),
+            "row_hash": fingerprint.row_fingerprint(last_visit_date, total_spent, visit_count, membership_type),
+        }
+
+def iter_batches(rows: Iterable[Dict], size: int = BATCH_SIZE) -> Iterator[List[Dict]]:
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+class _CountingReader:
+    """包住 binary file，記錄已讀取的 bytes，用來算進度與 ETA。"""
+
+    def __init__(self, fileobj: BinaryIO):
+        self._f = fileobj
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        started = time.perf_counter()
+        chunk = self._f.read(size)
+        self.read_seconds += time.perf_counter() - started
+        self.bytes_read += len(chunk)
+        return chunk
+
+def _timed_batches(batches: Iterable[List[Dict]], reader, fmt: str) -> Iterator[List[Dict]]:
+    """記錄每批的 read / parse 時間（在解析 thread 上量）。"""
+    it = iter(batches)
+    while True:
+        read_before = getattr(reader, "read_seconds", 0.0)
+        started = time.perf_counter()
+        batch = next(it, None)
+        if batch is None:
+            return
+        read = getattr(reader, "read_seconds", 0.0) - read_before
+        if hasattr(reader, "read_seconds"):
+            import_stage_seconds.observe(read, fmt, "read")
+        import_stage_seconds.observe(time.perf_counter() - started - read, fmt, "parse")
+        yield batch
+
+_DONE = object()
+
+def prefetch(items: Iterable, depth: int) -> Iterator:
+    """
+    在另一個 thread 先產生 items（解析），透過最多 depth 個的 queue 交給呼叫端（寫 DB）：
+    解析與寫入可以重疊，但解析最多只領先 depth 批（back-pressure），記憶體固定。
+    呼叫端提早結束（例如寫入失敗）時，解析 thread 也會跟著停。
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def _put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in items:
+                if not _put((item, None)):
+                    return
+            _put((_DONE, None))
+        except BaseException as e:
+            _put((_DONE, e))
+        finally:
+            if stop.is_set() and hasattr(items, "close"):
+                items.close()
+
+    threading.Thread(target=_produce, name="import-parse", daemon=True).start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+def _error_detail(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return traceback.format_exc()
+
+def write_batch(db: Session, loader, batch: List[Dict], delta: bool = True) -> Tuple[int, int, int]:
+    """
+    寫入一批並回傳 (inserted, updated, unchanged)，三者加總 = len(batch)；commit 由呼叫端決定。
+    呼叫端要在 customer_stats.rollup_writer() 裡呼叫並 commit（彙總表的讀舊值 / 套差異不能與其他寫入者交錯）。
+    delta=True 時內容指紋沒變的 row 直接略過（app/core/fingerprint.py），不寫 DB、不動彙總與快取。
+    """
+    if delta:
+        rows, unchanged = fingerprint.split_changed(db, batch)
+    else:
+        rows, unchanged = batch, 0
+    # 同一批裡被後面蓋掉的重複 code 與原本一樣算 updated（整批都沒變時也是），三者加總才會是 len(batch)
+    if not rows:
+        return 0, len(batch) - unchanged, unchanged
+
+    customer_stats.record_upserts(db, rows)  # 要在寫入前，才查得到舊值
+    inserted, _ = loader.load(rows)
+    suggestion_cache.invalidate_customers(db, (r["customer_code"] for r in rows))
+    return inserted, len(batch) - unchanged - inserted, unchanged
+
+def run_import(db: Session, import_id, path: str, fmt: str = "csv", delta: bool = True) -> ImportResult:
+    """
+    真正的匯入流程（背景 worker 與同步模式共用）。
+    fmt：csv / parquet / arrow（欄式格式見 app/core/columnar.py）。
+    delta=True（預設）：內容沒變的 row 不重寫，只有新增 / 變動的筆數會產生寫入；False 則全部重新 upsert。
+    每批寫入後連同 ImportRecord 的進度一起 commit：
+    輪詢端能即時看到進度，失敗時已寫入的批次保留（upsert 可重跑），並記錄 error_message。
+    """
+    import_rec = db.get(ImportRecord, import_id)
+    started = time.monotonic()
+    import_rec.status = "processing"
+    import_rec.started_at = datetime.now(timezone.utc)
+    import_rec.bytes_total = os.path.getsize(path)
+    db.commit()
+
+    loader = get_bulk_loader(db)
+    inserted = updated = unchanged = total_rows = 0
+    try:
+        with open(path, "rb") as f:
+            if (
+                fmt == "csv" and parse_processes() > 1
+                and import_rec.bytes_total >= settings.IMPORT_PARALLEL_MIN_BYTES
+                and not has_quotes(path)
+            ):
+                # 大檔：切成多個 byte range 交給 process pool 解析（app/core/parallel_csv.py）
+                reader = ParallelCSVReader(path)
+                batches = reader.iter_batches(loader.batch_size)
+            elif fmt == "csv":
+                reader = _CountingReader(f)
+                batches = iter_batches(iter_customer_rows(iter_text_lines(reader)), loader.batch_size)
+            else:
+                reader = ColumnarReader(path, fmt)
+                batches = reader.iter_batches(loader.batch_size)
+            # 解析在另一個 thread 先跑，這個 thread 只負責寫 DB
+            waiting_since = time.perf_counter()
+            for batch in prefetch(_timed_batches(batches, reader, fmt), settings.IMPORT_PREFETCH_BATCHES):
+                t0 = time.perf_counter()
+                import_stage_seconds.observe(t0 - waiting_since, fmt, "wait")
+                import_rec.rows_parsed = total_rows + len(batch)
+
+                # 讀舊值 -> 寫入 -> 彙總差異 -> commit 要與其他匯入 / 風險 refresh 互斥（等待時間算在 upsert）
+                with customer_stats.rollup_writer(db):
+                    ins, upd, same = write_batch(db, loader, batch, delta)
+                    t1 = time.perf_counter()
+                    import_stage_seconds.observe(t1 - t0, fmt, "upsert")
+                    inserted += ins
+                    updated += upd
+                    unchanged += same
+                    total_rows += len(batch)
+
+                    elapsed = max(time.monotonic() - started, 1e-6)
+                    import_rec.rows_written = total_rows
+                    import_rec.row_count = total_rows
+                    import_rec.inserted = inserted
+                    import_rec.updated = updated
+                    import_rec.unchanged = unchanged
+                    import_rec.bytes_read = reader.bytes_read
+                    import_rec.rows_per_sec = total_rows / elapsed
+                    bytes_per_sec = reader.bytes_read / elapsed
+                    remaining = max(import_rec.bytes_total - reader.bytes_read, 0)
+                    import_rec.eta_seconds = remaining / bytes_per_sec if bytes_per_sec else None
+                    db.commit()
+                waiting_since = time.perf_counter()
+                import_stage_seconds.observe(waiting_since - t1, fmt, "commit")
+                import_rows_total.inc(fmt, amount=len(batch) - same)
+                import_rows_unchanged_total.inc(fmt, amount=same)
+    except Exception as e:
+        db.rollback()
+        err_msg = _error_detail(e)
+        logger.error("Import %s failed: %s", import_id, err_msg)
+        import_duration_seconds.observe(time.monotonic() - started, fmt, "failed")
+        import_rec = db.get(ImportRecord, import_id)
+        import_rec.status = "failed"
+        import_rec.error_message = err_msg
+        import_rec.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        invalidate_counts()  # 失敗前已 commit 的批次仍然寫進去了
+        raise
+
+    import_rec.status = "done"
+    import_rec.row_count = total_rows
+    import_rec.eta_seconds = 0
+    import_rec.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    invalidate_counts()
+    import_duration_seconds.observe(time.monotonic() - started, fmt, "done")
+    logger.info(
+        "Import %s done: %d rows (%d inserted, %d updated, %d unchanged)",
+        import_id, total_rows, inserted, updated, unchanged,
+    )
+
+    return ImportResult(
+        import_id=str(import_id),
+        inserted=inserted,
+        updated=updated,
+        unchanged=unchanged,
+        total_rows=total_rows,
+    )
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_WORKERS, thread_name_prefix="import")
+    return _executor
+
+def _import_job(import_id, path: str, fmt: str, delta: bool) -> ImportResult:
+    db = SessionLocal()
+    try:
+        return run_import(db, import_id, path, fmt, delta)
+    finally:
+        db.close()
+        os.remove(path)
+
+def submit_import(import_id, path: str, fmt: str = "csv", delta: bool = True) -> Future:
+    """
+    丟給匯入專用的 worker pool（不佔 FastAPI 的 threadpool、不在 event loop 上跑）；
+    path 是已存到暫存檔的上傳內容，job 結束後刪除。
+    背景模式不用理會回傳的 Future（錯誤已寫進 ImportRecord.error_message），
+    同步模式可以 await asyncio.wrap_future(...) 等結果。
+    """
+    return _get_executor().submit(_import_job, import_id, path, fmt, delta)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+# LLM provider 抽象層：generate() 一律是 async，不佔 FastAPI 的 threadpool
+# - mock：本地假資料（預設）
+# - openai：任何 OpenAI 相容的 /chat/completions（OpenAI、vLLM、本地 stub server 都可以）
+#   用 LLM_BASE_URL 指過去即可，例如 scripts/llm_stub_server.py
+
+# 這些狀態碼視為暫時性錯誤，會重試
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+SYSTEM_PROMPT = (
+    "你是 CRM 客戶關懷助理。根據客戶資料產生跟進建議，只回傳 JSON，格式為："
+    '{"summary": str, "scripts": {"line": str, "sms": str, "call": str}, '
+    '"next_actions": [str], "tags": [str]}'
+)
+
+# 串流模式：請模型用「@@區塊名」分段輸出純文字，才能邊收 token 邊分區塊往前端送
+SECTIONS = ("summary", "line", "sms", "call", "next_actions", "tags")
+STREAM_SYSTEM_PROMPT = (
+    "你是 CRM 客戶關懷助理。根據客戶資料產生跟進建議。"
+    "依序輸出以下區塊，每個區塊以獨立一行的標記開頭：@@summary、@@line、@@sms、@@call、"
+    "@@next_actions（每行一項）、@@tags（以逗號分隔）。不要輸出其他內容。"
+)
+
+
+def sections_of(result: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """完整建議 -> 依 SECTIONS 順序的 (區塊, 文字)。"""
+    scripts = result.get("scripts") or {}
+    return [
+        ("summary", result.get("summary", "")),
+        ("line", scripts.get("line", "")),
+        ("sms", scripts.get("sms", "")),
+        ("call", scripts.get("call", "")),
+        ("next_actions", "\n".join(result.get("next_actions", []))),
+        ("tags", ",".join(result.get("tags", []))),
+    ]
+
+
+def assemble_sections(risk_level: str, texts: Dict[str, str]) -> Dict[str, Any]:
+    """串流收完的各區塊文字 -> 跟非串流 API 一樣格式的 dict。"""
+    def _lines(v: str) -> List[str]:
+        return [x.strip().lstrip("-•").strip() for x in v.splitlines() if x.strip()]
+
+    return {
+        "risk_level": risk_level,
+        "summary": texts.get("summary", "").strip(),
+        "scripts": {k: texts.get(k, "").strip() for k in ("line", "sms", "call")},
+        "next_actions": _lines(texts.get("next_actions", "")),
+        "tags": [t.strip() for t in texts.get("tags", "").replace("\n", ",").split(",") if t.strip()],
+    }
+
+
+class _SectionParser:
+    """把模型吐出來的 token 依 @@標記 切成 (區塊, 增量文字)，標記被切在兩個 token 中間也沒關係。"""
+
+    def __init__(self):
+        self.section: Optional[str] = None
+        self._pending = ""
+        self._line_start = True
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        self._pending += delta
+        out: List[Tuple[str, str]] = []
+        while self._pending:
+            if self._line_start and self._pending.startswith("@@"):
+                nl = self._pending.find("\n")
+                if nl < 0:
+                    break  # 標記那一行還沒收完
+                name = self._pending[2:nl].strip()
+                self._pending = self._pending[nl + 1:]
+                if name in SECTIONS:
+                    self.section = name
+                continue
+            if self._line_start and "@@".startswith(self._pending):
+                break  # 可能是標記的開頭，等下一個 token
+
+            nl = self._pending.find("\n")
+            text = self._pending if nl < 0 else self._pending[:nl + 1]
+            self._pending = self._pending[len(text):]
+            self._line_start = text.endswith("\n")
+            if self.section:
+                out.append((self.section, text))
+        return out
+
+    def flush(self) -> List[Tuple[str, str]]:
+        text, self._pending = self._pending, ""
+        return [(self.section, text)] if self.section and text else []
+
+
+class AsyncRateLimiter:
+    """簡單的 token bucket：每秒最多 rate 次，rate <= 0 代表不限速。"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class LLMProvider:
+    name = "base"
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        # 同一 process 內所有請求共用：同時最多 LLM_MAX_CONCURRENCY 個、每秒最多 LLM_RATE_LIMITS[name] 個
+        self._sem = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._limiter = AsyncRateLimiter(settings.LLM_RATE_LIMITS.get(self.name, 0))
+
+    async def generate(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._sem:
+            await self._limiter.acquire()
+            return await self._generate(inputs)
+
+    async def _generate(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def stream(self, inputs: Dict[str, Any]) -> AsyncIterator[Tuple[str, str]]:
+        """逐段產生 (區塊, 增量文字)。不支援串流的 provider 就整份產生完再一段一段送。"""
+        result = await self.generate(inputs)
+        for section, text in sections_of(result):
+            yield section, text
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MockProvider(LLMProvider):
+    name = "mock"
+
+    async def _generate(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        from app.core.llm_service import _mock_suggestion
+        s = _mock_suggestion(**inputs)
+        return {
+            "risk_level": s.risk_level,
+            "summary": s.summary,
+            "scripts": s.scripts,
+            "next_actions": s.next_actions,
+            "tags": s.tags,
+        }
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self):
+        super().__init__()
+        # 共用一個 keep-alive 連線池，避免每次都重新 TLS handshake
+        self._client = httpx.AsyncClient(
+            base_url=settings.LLM_BASE_URL,
+            headers={"Authorization": f"Bearer {settings.LLM_API_KEY}"} if settings.LLM_API_KEY else {},
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_POOL_SIZE,
+                max_keepalive_connections=settings.LLM_POOL_SIZE,
+            ),
+        )
+
+    def _request_body(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": settings.LLM_MODEL,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(inputs, ensure_ascii=False)},
+            ],
+        }
+
+    def _stream_body(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": settings.LLM_MODEL,
+            "stream": True,
+            "messages": [
+                {"role": "system", "content": STREAM_SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(inputs, ensure_ascii=False)},
+            ],
+        }
+
+    async def generate(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # 每次嘗試各自拿 _sem / rate limit（見 _post_with_retry），重試前的等待不佔併發名額
+        return await self._generate(inputs)
+
+    async def stream(self, inputs: Dict[str, Any]) -> AsyncIterator[Tuple[str, str]]:
+        # 只有在還沒收到任何內容前才重試，已經送出去的段落沒辦法收回
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            started = False
+            try:
+                async with self._sem:
+                    await self._limiter.acquire()
+                    async with self._client.stream("POST", "/chat/completions", json=self._stream_body(inputs)) as resp:
+                        if resp.status_code in RETRY_STATUS:
+                            raise httpx.HTTPStatusError(
+                                f"LLM provider returned {resp.status_code}", request=resp.request, response=resp
+                            )
+                        resp.raise_for_status()
+                        parser = _SectionParser()
+                        async for line in resp.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                            for ev in parser.feed(delta or ""):
+                                started = True
+                                yield ev
+                        for ev in parser.flush():
+                            yield ev
+                        return
+            except (httpx.TransportError, httpx.TimeoutException, httpx.HTTPStatusError) as e:
+                retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRY_STATUS
+                if started or not retryable or attempt >= settings.LLM_MAX_RETRIES:
+                    raise
+                backoff = min(settings.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt), 10.0)
+                await asyncio.sleep(random.uniform(0, backoff))
+
+    async def _post_with_retry(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        last_error: Optional[Exception] = None
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            retry_after: Optional[float] = None
+            try:
+                async with self._sem:
+                    await self._limiter.acquire()
+                    resp = await self._client.post("/chat/completions", json=body)
+                if resp.status_code not in RETRY_STATUS:
+                    resp.raise_for_status()
+                    return resp.json()
+                last_error = httpx.HTTPStatusError(
+                    f"LLM provider returned {resp.status_code}", request=resp.request, response=resp
+                )
+                header = resp.headers.get("Retry-After", "")
+                if header.replace(".", "", 1).isdigit():
+                    # 上游要求的等待時間也有上限，避免一個 Retry-After: 3600 把請求卡住一小時
+                    retry_after = min(float(header), settings.LLM_MAX_RETRY_AFTER_SECONDS)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                last_error = e
+
+            if attempt < settings.LLM_MAX_RETRIES:
+                # exponential backoff + full jitter，避免大量請求同時重試；等待時已經放掉 _sem
+                backoff = min(settings.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt), 10.0)
+                await asyncio.sleep(retry_after if retry_after is not None else random.uniform(0, backoff))
+        raise RuntimeError(f"LLM request failed after {settings.LLM_MAX_RETRIES + 1} attempts: {last_error}")
+
+    async def _generate(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        data = await self._post_with_retry(self._request_body(inputs))
+        content = json.loads(data["choices"][0]["message"]["content"])
+        scripts = content.get("scripts") or {}
+        return {
+            # 風險等級以後端規則為準，不讓模型改
+            "risk_level": inputs["risk_level"],
+            "summary": str(content.get("summary", "")),
+            "scripts": {k: str(scripts.get(k, "")) for k in ("line", "sms", "call")},
+            "next_actions": [str(x) for x in content.get("next_actions", [])],
+            "tags": [str(x) for x in content.get("tags", [])],
+        }
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+PROVIDERS = {
+    MockProvider.name: MockProvider,
+    OpenAICompatibleProvider.name: OpenAICompatibleProvider,
+}
+
+_instances: Dict[str, LLMProvider] = {}
+
+def get_provider(name: str) -> LLMProvider:
+    if name not in PROVIDERS:
+        raise RuntimeError(f"Unsupported LLM_PROVIDER={name}. Use one of: {', '.join(PROVIDERS)}")
+    # 連線池與 semaphore 綁在建立時的 event loop 上；換了 loop（例如測試）就重建
+    loop = asyncio.get_running_loop()
+    inst = _instances.get(name)
+    if inst is None or inst.loop is not loop:
+        inst = _instances[name] = PROVIDERS[name]()
+    return inst
+
+async def close_providers() -> None:
+    for p in list(_instances.values()):
+        await p.aclose()
+    _instances.clear()
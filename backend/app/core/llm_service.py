@@ -1,12 +1,27 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from datetime import date
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
+import asyncio
 import os
 import random
+import time
+
+from app.core import metrics
 
 RiskLevel = Literal["low", "medium", "high"]
 
+# prompt / 輸出格式有改就往上加，舊的快取結果自動失效
+PROMPT_VERSION = "v1"
+
+# 實際打到 provider 的呼叫（快取命中不算）；串流版本量到整段送完
+llm_request_seconds = metrics.histogram(
+    "llm_request_duration_seconds", "LLM provider call latency (cache misses only)", ("provider", "mode", "status"),
+)
+llm_first_token_seconds = metrics.histogram(
+    "llm_first_token_seconds", "Time until the first streamed section arrives", ("provider",),
+)
+
 @dataclass
 class FollowupSuggestion:
     risk_level: RiskLevel
@@ -76,12 +91,10 @@ def _mock_suggestion(
         tags=tags,
     )
 
-def generate_followup_suggestion(payload: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    payload 由後端組合後丟進來（不直接信任前端輸入）
-    先做 mock；之後可切換成真正 LLM provider。
-    """
+def _prepare(payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any], str]:
+    """正規化 payload，回傳 (provider, provider 輸入, 快取 key)。"""
     from app.core.config import settings
+    from app.core import suggestion_cache
     provider = settings.LLM_PROVIDER.lower()
 
     # 先取必備欄位
@@ -94,22 +107,116 @@ def generate_followup_suggestion(payload: Dict[str, Any]) -> Dict[str, Any]:
     if risk_level not in ("low", "medium", "high"):
         risk_level = "low"
 
-    if provider == "mock":
-        s = _mock_suggestion(
-            customer_code=customer_code,
-            membership_type=membership_type,
-            days_since_last_visit=days_since,
-            total_spent=total_spent,
-            visit_count=visit_count,
-            risk_level=risk_level,  # type: ignore
-        )
-        return {
-            "risk_level": s.risk_level,
-            "summary": s.summary,
-            "scripts": s.scripts,
-            "next_actions": s.next_actions,
-            "tags": s.tags,
-        }
-
-    # 先保留：之後接真 LLM（OpenAI / 自架模型）時用
-    raise RuntimeError(f"Unsupported LLM_PROVIDER={provider}. Use 'mock' for now.")
+    # 快取 key：正規化後的輸入 + provider + prompt 版本
+    # days_since 以 SUGGESTION_DAYS_BUCKET 天為一格，避免每過一天就全部重算
+    bucket = max(settings.SUGGESTION_DAYS_BUCKET, 1)
+    key = suggestion_cache.cache_key({
+        "customer_code": customer_code,
+        "membership_type": membership_type,
+        "days_since_bucket": days_since // bucket,
+        "total_spent": total_spent,
+        "visit_count": visit_count,
+        "risk_level": risk_level,
+    }, provider, PROMPT_VERSION)
+
+    inputs = {
+        "customer_code": customer_code,
+        "membership_type": membership_type,
+        "days_since_last_visit": days_since,
+        "total_spent": total_spent,
+        "visit_count": visit_count,
+        "risk_level": risk_level,
+    }
+    return provider, inputs, key
+
+async def generate_followup_suggestion(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    payload 由後端組合後丟進來（不直接信任前端輸入）
+    provider 由 LLM_PROVIDER 決定（見 app/core/llm_providers.py），全程 async。
+    """
+    from app.core import suggestion_cache
+    from app.core.llm_providers import get_provider
+    provider, inputs, key = _prepare(payload)
+
+    # L2 會查 DB，丟到 thread 免得卡住 event loop
+    cached = await asyncio.to_thread(suggestion_cache.get, key)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    status = "error"
+    try:
+        result = await get_provider(provider).generate(inputs)
+        status = "ok"
+    finally:
+        llm_request_seconds.observe(time.perf_counter() - started, provider, "generate", status)
+    await asyncio.to_thread(suggestion_cache.put, key, inputs["customer_code"], result)
+    return result
+
+async def stream_followup_suggestion(payload: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    串流版本，產生 (event, data)：
+    - ("delta", {"section": "summary", "text": "..."})：依 summary -> line -> sms -> call -> next_actions -> tags 的順序
+    - ("done", <完整建議，格式同 generate_followup_suggestion>)
+    有快取時直接整段送出。
+    """
+    from app.core import suggestion_cache
+    from app.core.llm_providers import assemble_sections, get_provider, sections_of
+    provider, inputs, key = _prepare(payload)
+
+    cached = await asyncio.to_thread(suggestion_cache.get, key)
+    if cached is not None:
+        for section, text in sections_of(cached):
+            yield "delta", {"section": section, "text": text}
+        yield "done", cached
+        return
+
+    texts: Dict[str, str] = {}
+    started = time.perf_counter()
+    status = "error"
+    try:
+        async for section, text in get_provider(provider).stream(inputs):
+            if not texts:
+                llm_first_token_seconds.observe(time.perf_counter() - started, provider)
+            texts[section] = texts.get(section, "") + text
+            yield "delta", {"section": section, "text": text}
+        status = "ok"
+    finally:
+        llm_request_seconds.observe(time.perf_counter() - started, provider, "stream", status)
+
+    result = assemble_sections(inputs["risk_level"], texts)
+    await asyncio.to_thread(suggestion_cache.put, key, inputs["customer_code"], result)
+    yield "done", result
+
+async def generate_followup_suggestions(payloads: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    批次版本：併發度與限速由 provider 控制（LLM_MAX_CONCURRENCY / LLM_RATE_LIMITS），
+    誰先完成就先 yield（不保證順序），單筆失敗不影響其他筆。
+    固定 LLM_MAX_CONCURRENCY 個 worker 輪流取下一筆，不會一次建出幾千個 task；
+    結果 queue 也是同樣大小，client 讀得慢時 worker 會停下來等。
+    """
+    from app.core.config import settings
+
+    async def _one(payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            suggestion = await generate_followup_suggestion(payload)
+            return {"customer_id": payload.get("customer_id"), "ok": True, "suggestion": suggestion}
+        except Exception as e:
+            return {"customer_id": payload.get("customer_id"), "ok": False, "error": str(e)}
+
+    concurrency = max(settings.LLM_MAX_CONCURRENCY, 1)
+    pending = iter(payloads)  # 單一 event loop，next() 不會被兩個 worker 同時呼叫
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def _worker() -> None:
+        for payload in pending:
+            await results.put(await _one(payload))
+
+    workers = [asyncio.create_task(_worker()) for _ in range(min(concurrency, len(payloads)))]
+    try:
+        for _ in range(len(payloads)):
+            yield await results.get()
+    finally:
+        # client 中途斷線時把還沒跑完的取消掉
+        for t in workers:
+            t.cancel()
@@ -0,0 +1,275 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 效能監控：process 內的 counter / histogram，GET /api/metrics 以 Prometheus text format 輸出
+# - MetricsMiddleware：每個 route 的延遲（含串流回應送完的時間）、每個請求的 SQL 次數與時間
+# - SQLAlchemy event：所有 engine（sync / async / replica / 匯入 worker）的查詢次數與時間
+# - 匯入各階段（read / parse / wait / upsert / commit）、LLM 呼叫延遲與建議快取命中率（見各模組）
+# 多個 worker process 時各自計數，由 Prometheus 端加總
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [各 bucket 的次數（非累積，最後一格是 +Inf）, sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            v[0][i] += 1
+            v[1] += value
+            v[2] += 1
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for labels, (counts, total, n) in items:
+            cumulative = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le_label = 'le="%s"' % _fmt(le)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le_label)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {n}"
+
+
+def family(kind: str, name: str, help: str, samples: Iterable[Tuple[str, Dict[str, str], float]]) -> List[str]:
+    """組出一個 metric family 的文字；samples 為 (名稱後綴, labels, 值)，值為 None 的略過。"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{suffix}{_labels(list(labels), list(labels.values()))} {_fmt(value)}")
+    return lines
+
+
+_registry: List = []
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    c = Counter(name, help, labelnames)
+    _registry.append(c)
+    return c
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    h = Histogram(name, help, labelnames, buckets)
+    _registry.append(h)
+    return h
+
+def register_collector(fn: Callable[[], List[str]]) -> None:
+    """讀取時才向其他模組要數字（例如 suggestion_cache.stats()）；fn 回傳用 family() 組好的文字行。"""
+    _registry.append(fn)
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        if callable(metric):
+            lines.extend(metric())
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# ---- HTTP ----
+
+http_request_seconds = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route (until the response body is fully sent)",
+    ("method", "route", "status"),
+)
+http_db_queries = histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request", ("method", "route"), COUNT_BUCKETS,
+)
+http_db_seconds = histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per HTTP request", ("method", "route"),
+)
+
+# ---- DB ----
+
+db_queries_total = counter("db_queries_total", "SQL statements executed (all engines)")
+db_query_seconds = histogram("db_query_duration_seconds", "SQL statement latency (all engines)")
+
+
+class _RequestDBStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+# run_in_threadpool / AsyncSession.run_sync 都會帶著 context 走，所以 thread 裡的查詢也算得到這個請求
+_request_db: contextvars.ContextVar[Optional[_RequestDBStats]] = contextvars.ContextVar("request_db", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("_query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    db_queries_total.inc()
+    db_query_seconds.observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("_query_started"):
+        conn.info["_query_started"].pop()
+
+
+class MetricsMiddleware:
+    """純 ASGI middleware（不用 BaseHTTPMiddleware，串流回應不會被緩衝）。"""
+
+    def __init__(self, app, skip_paths: Sequence[str] = ("/api/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = _RequestDBStats()
+        token = _request_db.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            # 用 route 樣板（/api/customers/{customer_id}）當 label，沒對到 route 的一律 unmatched，避免 label 爆量
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_seconds.observe(elapsed, method, route, str(status["code"]))
+            http_db_queries.observe(stats.queries, method, route)
+            http_db_seconds.observe(stats.seconds, method, route)
+
+
+# ---- 其他模組自己維護的統計 ----
+
+def _db_pool_metrics() -> List[str]:
+    from app.core import db_pool
+
+    pools = db_pool.stats()
+    lines: List[str] = []
+    buckets = []
+    for name, p in pools.items():
+        cumulative = 0
+        for le, c in zip(db_pool.CHECKOUT_BUCKETS + (float("inf"),), p["wait_seconds_buckets"]):
+            cumulative += c
+            buckets.append(("_bucket", {"pool": name, "le": _fmt(le)}, cumulative))
+        buckets.append(("_sum", {"pool": name}, p["wait_seconds_sum"]))
+        buckets.append(("_count", {"pool": name}, p["checkouts"] + p["timeouts"]))
+    lines += family("histogram", "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", buckets)
+    lines += family("counter", "db_pool_checkout_timeouts_total", "Checkouts that hit pool_timeout",
+                    [("", {"pool": n}, p["timeouts"]) for n, p in pools.items()])
+    for key, help in (
+        ("checked_out", "Connections currently checked out"),
+        ("size", "Configured pool size"),
+        ("capacity", "pool_size + max_overflow"),
+        ("saturation", "checked_out / capacity"),
+    ):
+        lines += family("gauge", f"db_pool_{key}", help, [("", {"pool": n}, p[key]) for n, p in pools.items()])
+    return lines
+
+def _suggestion_cache_metrics() -> List[str]:
+    from app.core import suggestion_cache
+
+    s = suggestion_cache.stats()
+    lookups = s["memory_hits"] + s["db_hits"] + s["misses"]
+    lines = family("counter", "suggestion_cache_lookups_total", "Follow-up suggestion cache lookups by result", [
+        ("", {"result": "memory_hit"}, s["memory_hits"]),
+        ("", {"result": "db_hit"}, s["db_hits"]),
+        ("", {"result": "miss"}, s["misses"]),
+    ])
+    lines += family("gauge", "suggestion_cache_hit_ratio", "(memory_hits + db_hits) / lookups since start",
+                    [("", {}, (s["memory_hits"] + s["db_hits"]) / lookups if lookups else None)])
+    lines += family("counter", "suggestion_cache_evictions_total", "L1 LRU evictions", [("", {}, s["evictions"])])
+    lines += family("gauge", "suggestion_cache_memory_entries", "Entries in the L1 LRU", [("", {}, s["memory_size"])])
+    return lines
+
+def _auth_cache_metrics() -> List[str]:
+    from app.core import auth_cache
+
+    s = auth_cache.stats()
+    lines = family("counter", "auth_cache_lookups_total", "Auth fast-path cache lookups", [
+        ("", {"cache": "token", "result": "hit"}, s["token_hits"]),
+        ("", {"cache": "token", "result": "miss"}, s["token_misses"]),
+        ("", {"cache": "user", "result": "hit"}, s["user_hits"]),
+        ("", {"cache": "user", "result": "miss"}, s["user_misses"]),
+    ])
+    lines += family("gauge", "auth_cache_entries", "Entries in the auth caches", [
+        ("", {"cache": "token"}, s["tokens"]),
+        ("", {"cache": "user"}, s["users"]),
+    ])
+    return lines
+
+register_collector(_db_pool_metrics)
+register_collector(_suggestion_cache_metrics)
+register_collector(_auth_cache_metrics)
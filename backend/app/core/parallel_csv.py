@@ -0,0 +1,215 @@
+import codecs
+import csv
+import io
+import multiprocessing
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+# 大型 CSV 的多核心解析：
+# - 依換行切成多個 byte range，每個 range 丟到 process pool 解析 + 驗證
+# - worker 回傳精簡的欄式資料（array / list），不是每列一個 dict
+# - 主 process 依 range 順序取回（同一 code 出現多次時仍是「後面的蓋前面的」），再切成 loader 的 batch
+# - 同時在途的 range 數有上限（back-pressure），記憶體不會隨檔案大小成長
+# - 預設關閉（IMPORT_PARSE_PROCESSES=1），要自己打開
+# 限制：欄位內含換行的 quoted CSV 無法依換行切割；檔案裡只要出現雙引號（has_quotes）就改走單核心解析
+
+# 每個 range 的目標大小
+RANGE_BYTES = 8 * 1024 * 1024
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@dataclass
+class ParsedRange:
+    """一個 byte range 的解析結果（欄式）。"""
+
+    rows_seen: int = 0  # range 內的資料列數（含因為沒有 code 而略過的），用來換算全域列號
+    codes: List[str] = field(default_factory=list)
+    last_visit_days: array = field(default_factory=lambda: array("i"))
+    total_spent: array = field(default_factory=lambda: array("q"))
+    visit_count: array = field(default_factory=lambda: array("q"))
+    membership_types: List[str] = field(default_factory=list)
+    # 第一個錯誤：(range 內列號, 欄位種類, 原始值)；主 process 換成全域列號後重新丟出同樣的錯誤
+    error: Optional[Tuple[int, str, str]] = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+def read_header(path: str) -> Tuple[List[str], int]:
+    """回傳 (欄位名稱, 資料開始的 byte offset)。"""
+    with open(path, "rb") as f:
+        first = f.readline()
+    text = codecs.decode(first, "utf-8-sig", errors="replace")
+    fieldnames = next(csv.reader([text]), None)
+    if not fieldnames:
+        raise HTTPException(status_code=400, detail="CSV has no header")
+    return fieldnames, len(first)
+
+def has_quotes(path: str, chunk_size: int = 1024 * 1024) -> bool:
+    """資料區（header 之後）有沒有雙引號（quoted 欄位可能含換行，不能依換行切）。in 走 memchr，掃一遍很快。"""
+    with open(path, "rb") as f:
+        f.readline()
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return False
+            if b'"' in chunk:
+                return True
+
+def split_ranges(path: str, start: int, range_bytes: int = RANGE_BYTES) -> List[Tuple[int, int]]:
+    """把 [start, EOF) 切成約 range_bytes 大小、結尾都對齊在換行之後的區段。"""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < size:
+            end = min(start + range_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()  # 往後找到下一個換行
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def parse_range(path: str, start: int, end: int, fieldnames: List[str]) -> ParsedRange:
+    """worker 端：解析一個 byte range。規則與 importer.iter_customer_rows 相同。"""
+    from app.core.importer import _to_date, _to_int
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="replace")
+
+    idx = {name: i for i, name in enumerate(fieldnames)}  # 欄名重複時與 DictReader 一樣取後面的
+
+    def _get(row: List[str], name: str) -> Optional[str]:
+        i = idx.get(name)
+        return row[i] if i is not None and i < len(row) else None
+
+    out = ParsedRange()
+    for row in csv.reader(io.StringIO(text)):
+        if not row:
+            continue  # 與 DictReader 一樣略過空白列
+        out.rows_seen += 1
+        code = _get(row, "customer_code") or _get(row, "customer_id")
+        if not code:
+            continue
+
+        raw_date = (_get(row, "last_visit_date") or "").strip()
+        raw_spent = (_get(row, "total_spent") or "").strip()
+        raw_visits = (_get(row, "visit_count") or "").strip()
+        try:
+            last_visit_date = _to_date(raw_date, "")
+        except HTTPException:
+            out.error = (out.rows_seen, "date", raw_date)
+            return out
+        try:
+            spent = _to_int(raw_spent, "")
+        except HTTPException:
+            out.error = (out.rows_seen, "spent", raw_spent)
+            return out
+        try:
+            visits = _to_int(raw_visits, "")
+        except HTTPException:
+            out.error = (out.rows_seen, "visit", raw_visits)
+            return out
+
+        out.codes.append(code.strip())
+        out.last_visit_days.append(last_visit_date.toordinal() - _EPOCH_ORDINAL)
+        out.total_spent.append(spent)
+        out.visit_count.append(visits)
+        out.membership_types.append((_get(row, "membership_type") or "BASIC").strip())
+    return out
+
+def _raise_error(row_idx: int, kind: str, value: str) -> None:
+    """用與單核心解析相同的函式與訊息丟出錯誤（例如 "Invalid date for Row 12 date ..."）。"""
+    from app.core.importer import _to_date, _to_int
+
+    if kind == "date":
+        _to_date(value, f"Row {row_idx} date")
+    else:
+        _to_int(value, f"Row {row_idx} {kind}")
+    raise HTTPException(status_code=422, detail=f"Invalid value for Row {row_idx} {kind}: {value}")
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def parse_processes() -> int:
+    return settings.IMPORT_PARSE_PROCESSES or os.cpu_count() or 1
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # 匯入 worker 是多執行緒的 process，fork 可能把別的 thread 拿著的鎖一起複製過去；改用 forkserver / spawn
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=parse_processes(), mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+class ParallelCSVReader:
+    """
+    與 ColumnarReader 同樣的介面：iter_batches(batch_size) 產生 row dict 的 list，
+    bytes_read 為已完成解析的 bytes（給匯入進度用）。
+    """
+
+    def __init__(self, path: str, range_bytes: int = RANGE_BYTES):
+        self.path = path
+        self.range_bytes = range_bytes
+        self.bytes_read = 0
+
+    def _iter_parsed(self) -> Iterator[ParsedRange]:
+        fieldnames, data_start = read_header(self.path)
+        self.bytes_read = data_start
+        ranges = split_ranges(self.path, data_start, self.range_bytes)
+
+        pool = _get_pool()
+        max_in_flight = parse_processes() * 2
+        pending = deque()
+        todo = iter(ranges)
+        rows_before = 0
+        try:
+            while True:
+                while len(pending) < max_in_flight:
+                    r = next(todo, None)
+                    if r is None:
+                        break
+                    pending.append((r, pool.submit(parse_range, self.path, r[0], r[1], fieldnames)))
+                if not pending:
+                    return
+
+                (start, end), fut = pending.popleft()
+                parsed = fut.result()
+                if parsed.error:
+                    local_row, kind, value = parsed.error
+                    _raise_error(rows_before + local_row, kind, value)
+                rows_before += parsed.rows_seen
+                self.bytes_read = end
+                yield parsed
+        finally:
+            for _, fut in pending:
+                fut.cancel()
+
+    def iter_batches(self, batch_size: int) -> Iterator[List[Dict]]:
+        from app.core.columnar import rows_from_columns
+
+        for parsed in self._iter_parsed():
+            days = np.frombuffer(parsed.last_visit_days, dtype=np.int32)
+            for i in range(0, len(parsed), batch_size):
+                j = i + batch_size
+                yield rows_from_columns(
+                    parsed.codes[i:j],
+                    days[i:j],
+                    parsed.total_spent[i:j].tolist(),
+                    parsed.visit_count[i:j].tolist(),
+                    parsed.membership_types[i:j],
+                )
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.security import hash_password, verify_and_update_password
+
+# 登入 / 註冊的 bcrypt 計算（每次數百 ms 的 CPU）：
+# - 丟到專用、固定大小的 process pool（PASSWORD_HASH_PROCESSES），不佔 API 共用的 threadpool，
+#   上班尖峰一次大量登入也不會拖慢客戶列表等資料路徑
+# - pool 前面排隊的工作最多 PASSWORD_HASH_MAX_QUEUE 個，再多直接回 503 + Retry-After（back-pressure），
+#   不讓請求無限堆積
+# - cost 由 BCRYPT_ROUNDS 控制；登入時發現舊 hash 的 cost 不同，會順便用新 cost 重算（見 routers/auth.py）
+# 多個 worker process 時每個 worker 各自一個 pool
+
+password_hash_seconds = metrics.histogram(
+    "password_hash_duration_seconds", "bcrypt hash / verify latency including queue wait", ("op",),
+)
+password_hash_rejected_total = metrics.counter(
+    "password_hash_rejected_total", "bcrypt jobs rejected because the queue was full", ("op",),
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_pending = 0
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """PASSWORD_HASH_PROCESSES=0 時不開 process pool（開發 / 單核心環境），改丟 threadpool。"""
+    global _pool
+    if settings.PASSWORD_HASH_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        # API process 有 event loop 與 threadpool，不用 fork（可能複製到別的 thread 拿著的鎖）
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_PROCESSES, mp_context=multiprocessing.get_context(method),
+        )
+    return _pool
+
+def _capacity() -> int:
+    return max(settings.PASSWORD_HASH_PROCESSES, 1) + max(settings.PASSWORD_HASH_MAX_QUEUE, 0)
+
+async def _run(op: str, fn, *args):
+    global _pending
+    with _lock:
+        if _pending >= _capacity():
+            password_hash_rejected_total.inc(op)
+            raise HTTPException(
+                status_code=503, detail="Too many login requests, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _pending += 1
+
+    started = time.perf_counter()
+    try:
+        pool = _get_pool()
+        if pool is None:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.wrap_future(pool.submit(fn, *args))
+    finally:
+        with _lock:
+            _pending -= 1
+        password_hash_seconds.observe(time.perf_counter() - started, op)
+
+async def hash_password_async(password: str) -> str:
+    return await _run("hash", hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """回傳 (是否正確, 新 hash)；新 hash 不是 None 代表 cost 已變更，呼叫端要寫回 DB。"""
+    return await _run("verify", verify_and_update_password, password, hashed)
+
+def pending() -> int:
+    with _lock:
+        return _pending
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _password_hash_metrics() -> List[str]:
+    return metrics.family("gauge", "password_hash_pending", "bcrypt jobs running or queued", [
+        ("", {}, pending()),
+    ]) + metrics.family("gauge", "password_hash_capacity", "PASSWORD_HASH_PROCESSES + PASSWORD_HASH_MAX_QUEUE", [
+        ("", {}, _capacity()),
+    ])
+
+metrics.register_collector(_password_hash_metrics)
@@ -0,0 +1,150 @@
+import logging
+import threading
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core import customer_stats
+from app.core.count_cache import invalidate_counts
+from app.core.db import SessionLocal
+from app.core.risk_engine import RISK_LEVELS, from_epoch_days, iter_scored_customers
+from app.core.risk_rules import get_rule_set
+from app.models.customer import Customer
+
+# 流失風險規則本身定義在 settings.RISK_RULES（編譯見 app/core/risk_rules.py），預設：
+# VIP: High(>=150), Med(90-149), Low(<90)
+# Normal: High(>=120), Med(60-119), Low(<60)
+
+REFRESH_BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+def churn_rule(membership_type: str, days_since: int) -> Tuple[str, str]:
+    rules = get_rule_set()
+    level = rules.classify(membership_type, days_since)
+    return level, rules.reason(membership_type, level, days_since)
+
+def format_risk_reason(membership_type: str, risk_level: str, days_since: int) -> str:
+    """依已存好的 risk_level 組出與 churn_rule 相同的說明文字（不再重跑判斷）。"""
+    return get_rule_set().reason(membership_type, risk_level, days_since)
+
+def risk_fields(membership_type: str, last_visit_date: date, today: date) -> Dict:
+    """
+    算出要存進 customers 的風險欄位：
+    - risk_level：今天的等級
+    - risk_changes_on：哪一天會跨到下一個等級（high 之後不會再變，存 None）
+    - risk_version：用哪一版規則算的
+    days_since / risk_reason 每天都會變，不落地，由 last_visit_date 即時算。
+    """
+    rules = get_rule_set()
+    level = rules.classify(membership_type, (today - last_visit_date).days)
+    return {
+        "risk_level": level,
+        "risk_changes_on": rules.changes_on(membership_type, level, last_visit_date),
+        "risk_version": rules.version,
+    }
+
+def stale_risk_condition(today: date, version: str):
+    """
+    存的風險欄位已經不能用的 row：還沒算過、已跨過門檻 (risk_changes_on <= today)、或是用別版規則算的。
+    version 用 < / > 而不是 !=，才能走 index range scan。
+    """
+    return or_(
+        Customer.risk_level.is_(None),
+        Customer.risk_changes_on <= today,
+        Customer.risk_version.is_(None),
+        Customer.risk_version < version,
+        Customer.risk_version > version,
+    )
+
+def is_risk_stale(customer: Customer, today: date, version: str) -> bool:
+    """stale_risk_condition 的 Python 版（已載入的 Customer 用）。"""
+    return (
+        customer.risk_level is None
+        or (customer.risk_changes_on is not None and customer.risk_changes_on <= today)
+        or customer.risk_version != version
+    )
+
+def refresh_risk_tiers(db: Session, today: Optional[date] = None) -> int:
+    """
+    只重算「已跨過門檻」(risk_changes_on <= today)、還沒算過 (risk_level IS NULL)
+    或是用舊版規則算的 (risk_version 不同) 客戶。
+    每天跑一次時只會碰到當天剛好換等級的那一小撮 row。回傳更新筆數。
+    與匯入共用 customer_stats.rollup_writer()：同時只會有一個彙總表寫入者，
+    後到的 refresh 會等前一個 commit 後再查，只看得到剩下的 row。
+    """
+    with customer_stats.rollup_writer(db):
+        return _refresh_risk_tiers(db, today)
+
+def _refresh_risk_tiers(db: Session, today: Optional[date]) -> int:
+    today = today or date.today()
+    version = get_rule_set().version
+    stale = iter_scored_customers(
+        db,
+        where=stale_risk_condition(today, version),
+        today=today,
+        batch_size=REFRESH_BATCH_SIZE,
+    )
+
+    updated = 0
+    for batch in stale:
+        # 分級用向量化引擎一次算完，這裡只是把結果組成 executemany 參數
+        levels = RISK_LEVELS[batch.risk]
+        # 換了等級的 row 在 customer_rollup 裡從舊等級搬到新等級
+        moved = np.flatnonzero(batch.stored_risk_levels != levels)
+        lvds = [from_epoch_days(d) for d in batch.last_visit_days[moved]]
+        customer_stats.apply_delta(
+            db,
+            zip(batch.membership_types[moved], batch.stored_risk_levels[moved], lvds, batch.total_spent[moved].tolist()),
+            zip(batch.membership_types[moved], levels[moved].tolist(), lvds, batch.total_spent[moved].tolist()),
+        )
+        params = [
+            {
+                "id": int(cid),
+                "risk_level": str(level),
+                "risk_changes_on": from_epoch_days(changes_on),
+                "risk_version": version,
+            }
+            for cid, level, changes_on in zip(batch.ids, levels, batch.changes_on)
+        ]
+        db.execute(update(Customer), params)
+        updated += len(params)
+    db.commit()
+    if updated:
+        invalidate_counts()
+    return updated
+
+_refreshed_on: Optional[Tuple[date, str]] = None
+_refreshed_lock = threading.Lock()
+
+def _background_refresh(key: Tuple[date, str]) -> None:
+    global _refreshed_on
+    try:
+        # 一律在 primary 上做（replica 不能寫）
+        with SessionLocal() as db:
+            updated = refresh_risk_tiers(db, key[0])
+        logger.info("Risk refresh for %s (rules %s): %d customers", key[0], key[1], updated)
+    except Exception:
+        logger.exception("Background risk refresh failed")
+        with _refreshed_lock:
+            if _refreshed_on == key:
+                _refreshed_on = None  # 下一個請求再試
+
+def ensure_risk_fresh() -> None:
+    """
+    每個 process 每天（或規則版本變更後）最多觸發一次增量 refresh（cron 沒跑時的保險）。
+    single-flight：第一個發現過期的請求把工作丟給背景 thread 就返回，其他請求不會再觸發、也不用等。
+    refresh 跑完之前，存的等級已過期的 row（stale_risk_condition）在列表 / 篩選時一律改用規則即時判斷，
+    所以不會讀到過期的等級（只有 /stats 的彙總表要等 refresh commit 後才會跟上）；
+    大量重算（規則改版、第一次回填）請交給 scripts/refresh_risk.py 或啟動時的 refresh。
+    """
+    global _refreshed_on
+    key = (date.today(), get_rule_set().version)
+    with _refreshed_lock:
+        if _refreshed_on == key:
+            return
+        _refreshed_on = key
+    threading.Thread(target=_background_refresh, args=(key,), name="risk-refresh", daemon=True).start()
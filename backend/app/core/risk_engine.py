@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.risk_rules import NO_CHANGE, CompiledRuleSet, get_rule_set
+from app.core.risk_rules import RISK_LEVELS as _LEVEL_NAMES
+from app.models.customer import Customer
+
+# 向量化的流失風險計算（整張表 / 大批次用）
+# 規則來自 app/core/risk_rules.py 的編譯結果，與 churn_rule 完全一致，只是一次算一整個 numpy 陣列，
+# 不用每筆跑 Python 分支、也不先組 reason 字串（需要時才用 reason(i) 產生）
+
+RISK_LEVELS = np.array(_LEVEL_NAMES)
+
+# 1970-01-01 起算的天數 <-> date
+_EPOCH = date(1970, 1, 1)
+
+LOAD_BATCH_SIZE = 50000
+
+
+def to_epoch_days(dates: Sequence[date]) -> np.ndarray:
+    return np.array(dates, dtype="datetime64[D]").astype(np.int32)
+
+def from_epoch_days(days: int) -> Optional[date]:
+    if days == NO_CHANGE:
+        return None
+    return date.fromordinal(_EPOCH.toordinal() + int(days))
+
+def score_arrays(membership_idx: np.ndarray, last_visit_days: np.ndarray, today: date,
+                 rules: Optional[CompiledRuleSet] = None):
+    """
+    一次算完一整批：回傳 (days_since, risk_code, changes_on_days)
+    risk_code 為 RISK_LEVELS 的 index；changes_on_days 為下一次跨等級的日期（epoch 天數），最高等級為 NO_CHANGE
+    """
+    rules = rules or get_rule_set()
+    return rules.score(membership_idx, last_visit_days, (today - _EPOCH).days)
+
+
+@dataclass
+class ScoredCustomers:
+    """一批客戶的欄位式（columnar）資料 + 風險計算結果。"""
+
+    ids: np.ndarray
+    customer_codes: np.ndarray
+    membership_types: np.ndarray
+    last_visit_days: np.ndarray
+    total_spent: np.ndarray
+    visit_count: np.ndarray
+    membership_idx: np.ndarray
+    days_since: np.ndarray
+    risk: np.ndarray
+    changes_on: np.ndarray
+    rules: CompiledRuleSet
+    # 目前 DB 裡存的 risk_level（refresh 用來判斷哪些 row 換了等級）
+    stored_risk_levels: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def risk_level(self, i: int) -> str:
+        return str(RISK_LEVELS[self.risk[i]])
+
+    def reason(self, i: int) -> str:
+        return self.rules.reason(self.membership_types[i], self.risk_level(i), int(self.days_since[i]))
+
+
+def score_rows(rows: Sequence, today: date, rules: Optional[CompiledRuleSet] = None) -> ScoredCustomers:
+    """rows: (id, customer_code, membership_type, last_visit_date, total_spent, visit_count[, risk_level]) 的序列。"""
+    rules = rules or get_rule_set()
+    columns = list(zip(*rows)) if rows else [()] * 6
+    ids, codes, memberships, lvds, spent, visits = columns[:6]
+    membership_idx = rules.membership_indices(memberships)
+    last_visit_days = to_epoch_days(lvds)
+    days_since, risk, changes_on = score_arrays(membership_idx, last_visit_days, today, rules)
+    return ScoredCustomers(
+        ids=np.array(ids, dtype=np.int64),
+        customer_codes=np.array(codes, dtype=object),
+        membership_types=np.array(memberships, dtype=object),
+        last_visit_days=last_visit_days,
+        total_spent=np.array(spent, dtype=np.int64),
+        visit_count=np.array(visits, dtype=np.int64),
+        membership_idx=membership_idx,
+        days_since=days_since,
+        risk=risk,
+        changes_on=changes_on,
+        rules=rules,
+        stored_risk_levels=np.array(columns[6], dtype=object) if len(columns) > 6 else None,
+    )
+
+def iter_scored_customers(
+    db: Session,
+    where=None,
+    today: Optional[date] = None,
+    batch_size: int = LOAD_BATCH_SIZE,
+) -> Iterator[ScoredCustomers]:
+    """整張表（或 where 篩選後）分批載入並打分數；每批最多 batch_size 筆，記憶體固定。"""
+    today = today or date.today()
+    rules = get_rule_set()
+    query = select(
+        Customer.id, Customer.customer_code, Customer.membership_type,
+        Customer.last_visit_date, Customer.total_spent, Customer.visit_count, Customer.risk_level,
+    ).order_by(Customer.id)
+    if where is not None:
+        query = query.where(where)
+
+    result = db.execute(query.execution_options(yield_per=batch_size))
+    for part in result.partitions():
+        yield score_rows(part, today, rules)
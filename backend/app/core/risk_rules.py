@@ -0,0 +1,141 @@
+import json
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+
+from app.core.config import settings
+from app.models.customer import Customer
+
+# 宣告式的流失風險規則（settings.RISK_RULES / RISK_RULES_VERSION）：
+#   {"default": {"medium": 60, "high": 120}, "VIP": {"medium": 90, "high": 150}, "GOLD": {...}}
+# 每個會員等級給各風險等級的門檻天數（>= 門檻就進到該等級），沒列到的會員等級用 default。
+# 編譯一次後同一份定義同時產生：
+# - 單筆判斷（churn_rule / risk_fields 用）
+# - 向量化打分數（risk_engine 用）
+# - SQL predicate（last_visit_date 範圍條件，可走 index）
+# 規則一改就換 version，refresh 會把舊 version 算出來的 row 全部重算
+
+RISK_LEVELS = ("low", "medium", "high")
+DEFAULT_KEY = "default"
+
+# high 之後不會再變
+NO_CHANGE = np.iinfo(np.int32).max
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledRuleSet:
+    version: str
+    # 有特別設定的會員等級（大寫），index 0 保留給 default
+    memberships: Tuple[str, ...]
+    # 每列為遞增的門檻天數：單筆判斷用 tuple（不碰 numpy，匯入時每筆都會呼叫），
+    # 向量化用同內容的 ndarray，shape = (len(memberships) + 1, len(RISK_LEVELS) - 1)
+    table: Tuple[Tuple[int, ...], ...]
+    thresholds: np.ndarray
+
+    def membership_index(self, membership_type: Optional[str]) -> int:
+        m = (membership_type or "").upper()
+        return self.memberships.index(m) + 1 if m in self.memberships else 0
+
+    def membership_indices(self, membership_types: Sequence[Optional[str]]) -> np.ndarray:
+        arr = np.char.upper(np.array([m or "" for m in membership_types], dtype=str))
+        uniq, inverse = np.unique(arr, return_inverse=True)
+        lut = np.array([self.membership_index(u) for u in uniq], dtype=np.intp)
+        return lut[inverse.reshape(-1)] if len(arr) else np.zeros(0, dtype=np.intp)
+
+    def _prefix(self, membership_type: Optional[str]) -> str:
+        idx = self.membership_index(membership_type)
+        return f"{self.memberships[idx - 1]} " if idx else ""
+
+    def classify(self, membership_type: Optional[str], days_since: int) -> str:
+        row = self.table[self.membership_index(membership_type)]
+        return RISK_LEVELS[sum(days_since >= t for t in row)]
+
+    def reason(self, membership_type: Optional[str], risk_level: str, days_since: int) -> str:
+        prefix = self._prefix(membership_type)
+        level = RISK_LEVELS.index(risk_level)
+        if level == 0:
+            return f"{prefix}近期活躍 ({days_since} 天前)"
+        threshold = self.table[self.membership_index(membership_type)][level - 1]
+        return f"{prefix}已停滯 {days_since} 天 (>={threshold})"
+
+    def changes_on(self, membership_type: Optional[str], risk_level: str, last_visit_date: date) -> Optional[date]:
+        level = RISK_LEVELS.index(risk_level)
+        if level == len(RISK_LEVELS) - 1:
+            return None
+        threshold = self.table[self.membership_index(membership_type)][level]
+        return last_visit_date + timedelta(days=threshold)
+
+    def score(self, membership_idx: np.ndarray, last_visit_days: np.ndarray, today_days: int):
+        """向量化版本：回傳 (days_since, risk_code, changes_on_days)，日期皆為 epoch 天數。"""
+        rows = self.thresholds[membership_idx]
+        days_since = today_days - last_visit_days
+        risk = (days_since[:, None] >= rows).sum(axis=1).astype(np.int8)
+        # 下一個門檻；已是最高等級的補 NO_CHANGE
+        padded = np.concatenate([rows, np.full((len(rows), 1), NO_CHANGE, dtype=np.int64)], axis=1)
+        nxt = padded[np.arange(len(rows)), risk]
+        changes_on = np.where(nxt == NO_CHANGE, NO_CHANGE, last_visit_days + nxt).astype(np.int32)
+        return days_since, risk, changes_on
+
+    def sql_predicate(self, risk_level: str, today: date):
+        """
+        「今天會被判成 risk_level」的 SQL 條件：每個會員等級一段 last_visit_date 範圍，
+        搭配 (upper(membership_type), last_visit_date) index 使用。
+        """
+        level = RISK_LEVELS.index(risk_level)
+        membership = func.upper(Customer.membership_type)
+        branches = []
+        for idx in range(len(self.memberships) + 1):
+            row = self.table[idx]
+            conds = []
+            if idx:
+                conds.append(membership == self.memberships[idx - 1])
+            elif self.memberships:
+                conds.append(or_(Customer.membership_type.is_(None), membership.not_in(self.memberships)))
+            if level > 0:
+                conds.append(Customer.last_visit_date <= today - timedelta(days=row[level - 1]))
+            if level < len(RISK_LEVELS) - 1:
+                conds.append(Customer.last_visit_date > today - timedelta(days=row[level]))
+            branches.append(and_(*conds))
+        return or_(*branches)
+
+
+def _parse(rules: Dict[str, Dict[str, int]]) -> Tuple[Tuple[str, ...], Tuple[Tuple[int, ...], ...]]:
+    if DEFAULT_KEY not in rules:
+        raise ValueError(f"RISK_RULES must define a '{DEFAULT_KEY}' entry")
+
+    def _row(name: str, spec: Dict[str, int]) -> Tuple[int, ...]:
+        try:
+            row = tuple(int(spec[level]) for level in RISK_LEVELS[1:])
+        except KeyError as e:
+            raise ValueError(f"RISK_RULES[{name!r}] is missing threshold {e}")
+        if any(b <= a for a, b in zip(row, row[1:])):
+            raise ValueError(f"RISK_RULES[{name!r}] thresholds must be increasing: {row}")
+        return row
+
+    memberships = tuple(sorted(k.upper() for k in rules if k != DEFAULT_KEY))
+    by_upper = {k.upper(): v for k, v in rules.items() if k != DEFAULT_KEY}
+    table = [_row(DEFAULT_KEY, rules[DEFAULT_KEY])] + [_row(m, by_upper[m]) for m in memberships]
+    return memberships, tuple(table)
+
+
+@lru_cache(maxsize=8)
+def compile_rule_set(version: str, rules_json: str) -> CompiledRuleSet:
+    memberships, table = _parse(json.loads(rules_json))
+    thresholds = np.array(table, dtype=np.int64)
+    thresholds.setflags(write=False)
+    return CompiledRuleSet(version=version, memberships=memberships, table=table, thresholds=thresholds)
+
+
+_current: Optional[Tuple[str, object, CompiledRuleSet]] = None
+
+def get_rule_set() -> CompiledRuleSet:
+    """目前設定的規則（編譯結果快取起來，只有第一次呼叫或設定被換掉時才會解析）。"""
+    global _current
+    version, rules = settings.RISK_RULES_VERSION, settings.RISK_RULES
+    if _current is None or _current[0] != version or _current[1] is not rules:
+        _current = (version, rules, compile_rule_set(version, json.dumps(rules, sort_keys=True)))
+    return _current[2]
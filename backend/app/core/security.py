@@ -1,9 +1,19 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
 from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from passlib.context import CryptContext
-from jose import jwt
+from jose import JWTError, jwt
+from jose.exceptions import ExpiredSignatureError
 from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# cost 由 BCRYPT_ROUNDS 控制；cost 不同的舊 hash 會被 needs_update 判定要重算
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# 以下三個都是 CPU-bound，API 裡請透過 app/core/passwords.py 丟到專用 process pool
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -11,10 +21,55 @@ def hash_password(password: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """(是否正確, 新 hash)；密碼正確且舊 hash 的 cost 與目前設定不同時才會回傳新 hash。"""
+    return pwd_context.verify_and_update(plain, hashed)
+
 def create_access_token(sub: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {"sub": sub, "exp": expire}
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
+# HS* token 用標準庫的 hmac 直接驗（比 python-jose 快很多）；
+# 格式不是我們自己簽出來的樣子（其他演算法、額外 header、額外 claim）就交給 jose 完整驗證
+_HMAC_DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def _decode_hmac(token: str) -> Optional[dict]:
+    digest = _HMAC_DIGESTS.get(settings.JWT_ALGORITHM)
+    if digest is None:
+        return None
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        payload = json.loads(_b64decode(payload_b64))
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or header.get("alg") != settings.JWT_ALGORITHM or set(header) - {"alg", "typ"}:
+        return None
+    # 只接受 create_access_token 簽出來的形狀（剛好 sub: str + exp: int）；
+    # 其他 claim（aud / iss / nbf ...）或型別由 jose 完整驗證，兩條路徑接受的 token 才會一致
+    if (
+        not isinstance(payload, dict) or set(payload) != {"sub", "exp"}
+        or not isinstance(payload["sub"], str)
+        or not isinstance(payload["exp"], int) or isinstance(payload["exp"], bool)
+    ):
+        return None
+
+    expected = hmac.new(
+        settings.JWT_SECRET.encode("utf-8"), f"{header_b64}.{payload_b64}".encode("ascii"), digest,
+    ).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise JWTError("Signature verification failed.")
+    if payload["exp"] < int(time.time()):  # 與 jose 相同：以整數秒比較、沒有 leeway
+        raise ExpiredSignatureError("Signature has expired.")
+    return payload
+
 def decode_token(token: str) -> dict:
+    payload = _decode_hmac(token)
+    if payload is not None:
+        return payload
     return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
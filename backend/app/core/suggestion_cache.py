@@ -0,0 +1,120 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.suggestion_cache import SuggestionCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# 跟進建議的兩層快取（content-addressed）：
+# - L1：process 內 LRU（OrderedDict），最多 SUGGESTION_CACHE_SIZE 筆
+# - L2：DB 的 suggestion_cache 表，跨 worker / 重啟都還在
+# key 是輸入內容的 hash，客戶資料一改 key 就不同，舊結果自然不會被命中；
+# 重新匯入時另外依 customer_code 主動清掉，避免佔空間
+# L1 存的與回傳的都是 deepcopy：呼叫端會在回應上加欄位（customer_id / ok），不能改到快取裡的那一份
+
+# 每 N 次寫入順手清一次 DB 裡過期的資料
+PURGE_EVERY = 500
+
+_lock = threading.Lock()
+_lru: "OrderedDict[str, Tuple[Dict[str, Any], datetime, str]]" = OrderedDict()
+_keys_by_code: Dict[str, Set[str]] = {}
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+_writes = 0
+
+def cache_key(normalized: Dict[str, Any], provider: str, prompt_version: str) -> str:
+    raw = json.dumps(
+        {"payload": normalized, "provider": provider, "prompt_version": prompt_version},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _lru_put(key: str, customer_code: str, value: Dict[str, Any], expires_at: datetime) -> None:
+    with _lock:
+        _lru[key] = (copy.deepcopy(value), expires_at, customer_code)
+        _lru.move_to_end(key)
+        _keys_by_code.setdefault(customer_code, set()).add(key)
+        while len(_lru) > settings.SUGGESTION_CACHE_SIZE:
+            old_key, (_, _, old_code) = _lru.popitem(last=False)
+            _keys_by_code.get(old_code, set()).discard(old_key)
+            _stats["evictions"] += 1
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    now = datetime.utcnow()
+    with _lock:
+        hit = _lru.get(key)
+        if hit and hit[1] > now:
+            _lru.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return copy.deepcopy(hit[0])
+
+    db = SessionLocal()
+    try:
+        row = db.get(SuggestionCacheEntry, key)
+        if row and row.expires_at > now:
+            value = json.loads(row.suggestion_json)
+            _lru_put(key, row.customer_code, value, row.expires_at)
+            with _lock:
+                _stats["db_hits"] += 1
+            return value
+    except Exception as e:
+        # 快取層壞掉不該讓建議功能跟著壞，當成 miss
+        logger.warning("Suggestion cache read failed: %s", e)
+    finally:
+        db.close()
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+def put(key: str, customer_code: str, value: Dict[str, Any]) -> None:
+    global _writes
+    expires_at = datetime.utcnow() + timedelta(seconds=settings.SUGGESTION_CACHE_TTL_SECONDS)
+    _lru_put(key, customer_code, value, expires_at)
+
+    db = SessionLocal()
+    try:
+        db.merge(SuggestionCacheEntry(
+            key=key,
+            customer_code=customer_code,
+            suggestion_json=json.dumps(value, ensure_ascii=False),
+            expires_at=expires_at,
+        ))
+        with _lock:
+            _writes += 1
+            purge = _writes % PURGE_EVERY == 0
+        if purge:
+            db.execute(delete(SuggestionCacheEntry).where(SuggestionCacheEntry.expires_at <= datetime.utcnow()))
+        db.commit()
+    except Exception as e:
+        # 例如 SQLite 正在被匯入鎖住：只留 L1，下次再寫
+        db.rollback()
+        logger.warning("Suggestion cache write failed: %s", e)
+    finally:
+        db.close()
+
+def invalidate_customers(db: Session, customer_codes: Iterable[str]) -> None:
+    """客戶資料被重新匯入時呼叫：清掉這些客戶在兩層快取裡的建議。"""
+    codes: List[str] = list(customer_codes)
+    with _lock:
+        for code in codes:
+            for key in _keys_by_code.pop(code, ()):
+                _lru.pop(key, None)
+
+    # 分段刪，避免一次塞太多 IN() 參數
+    for i in range(0, len(codes), 1000):
+        db.execute(delete(SuggestionCacheEntry).where(SuggestionCacheEntry.customer_code.in_(codes[i:i + 1000])))
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "memory_size": len(_lru)}
@@ -1,17 +1,34 @@
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
 
-from app.core.db import Base, engine
+from app.core import metrics, passwords
+from app.core.db import Base, dispose_async_engine, engine, missing_columns
+from app.core.risk import ensure_risk_fresh
 from app.routers.auth import router as auth_router
 
 from app.models.customer import Customer  # noqa: F401
+from app.models.customer_stats import CustomerRollup  # noqa: F401
+from app.models.suggestion_cache import SuggestionCacheEntry  # noqa: F401
 from app.routers.customers import router as customers_router
+from app.core.llm_providers import close_providers
+
 
 
+logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# 第三方套件的 INFO（每個 SQL / pool 事件 / HTTP 呼叫）太吵，效能數字看 /api/metrics
+# （app.core.db_pool：SQLAlchemy 依 pool class 所在模組命名 pool 的 logger）
+for _name in ("sqlalchemy", "httpx", "app.core.db_pool"):
+    logging.getLogger(_name).setLevel(logging.WARNING)
 
 app = FastAPI(title="InsightPilot API", version="0.2.0")
 
+# 每個 route 的延遲、每個請求的 SQL 次數 / 時間（見 app/core/metrics.py）
+app.add_middleware(metrics.MetricsMiddleware)
+
 
 # 你原本的 CORS 清單保留（很OK）
 app.add_middleware(
@@ -32,11 +49,34 @@ app.add_middleware(
 
 # ✅ 開發期：啟動時自動建表（users）
 Base.metadata.create_all(bind=engine)
+# 舊表缺欄位（升級後還沒 migrate）直接拒絕啟動，不要等到第一個查詢才 500
+_missing = missing_columns(engine)
+if _missing:
+    raise RuntimeError(
+        f"Database schema is out of date (missing columns: {', '.join(_missing)}). "
+        "Run `python scripts/init_db.py` to migrate, then restart the API."
+    )
+
+@app.on_event("startup")
+async def _startup():
+    # 啟動時就在背景補跑當天的風險 refresh，不讓第一個請求碰到過期的等級
+    ensure_risk_fresh()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await close_providers()
+    await dispose_async_engine()
+    passwords.shutdown()
 
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text format：HTTP / SQL / 連線池 / 匯入各階段 / LLM / 建議快取 / 密碼 hash。"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ✅ 掛上登入相關 API
 app.include_router(auth_router)
 app.include_router(customers_router)
@@ -1,5 +1,5 @@
-from datetime import datetime
-from sqlalchemy import String, Integer, DateTime, Date
+from datetime import datetime, date
+from sqlalchemy import String, Integer, DateTime, Date, Index, func
 from sqlalchemy.orm import Mapped, mapped_column
 from app.core.db import Base
 
@@ -15,3 +15,18 @@ class Customer(Base):
     membership_type: Mapped[str] = mapped_column(String(50), index=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    # 預先算好的流失風險（app/core/risk.py 維護）
+    # risk_changes_on：下一次跨等級的日期，每日 refresh 只重算 <= 今天的 row
+    risk_level: Mapped[str | None] = mapped_column(String(10), index=True, nullable=True)
+    risk_changes_on: Mapped[date | None] = mapped_column(Date, index=True, nullable=True)
+    # 用哪一版 RISK_RULES 算的；規則改版後 refresh 會把舊版的 row 重算
+    risk_version: Mapped[str | None] = mapped_column(String(20), index=True, nullable=True)
+
+    # 內容指紋（app/core/fingerprint.py）；delta 匯入用來略過沒變的 row
+    row_hash: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+    __table_args__ = (
+        # risk_rules 編譯出來的 SQL predicate：upper(membership_type) = ? AND last_visit_date 範圍
+        Index("ix_customers_membership_upper_last_visit", func.upper(membership_type), last_visit_date),
+    )
@@ -0,0 +1,21 @@
+from datetime import date
+from sqlalchemy import String, Integer, BigInteger, Date
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+class CustomerRollup(Base):
+    """
+    GET /api/customers/stats 用的彙總表（app/core/customer_stats.py 維護）。
+    一列 = membership_type × risk_level × 最後來店月份 × 消費金額級距，
+    匯入 / 風險 refresh 時以增量 (+/-) 更新，dashboard 只讀這張小表。
+    """
+    __tablename__ = "customer_rollup"
+
+    membership_type: Mapped[str] = mapped_column(String(50), primary_key=True)
+    risk_level: Mapped[str] = mapped_column(String(10), primary_key=True)
+    # 月份固定不隨日期變動，讀取時再換算成「幾個月前」的 recency 區間
+    visit_month: Mapped[date] = mapped_column(Date, primary_key=True)
+    spent_bucket: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    customers: Mapped[int] = mapped_column(Integer, default=0)
+    total_spent: Mapped[int] = mapped_column(BigInteger, default=0)
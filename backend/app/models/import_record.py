@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, BigInteger, Float, String, DateTime, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.core.db import Base
@@ -9,7 +9,20 @@ class ImportRecord(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     filename = Column(Text, nullable=True)
-    status = Column(Text, default="processing")  # processing, done, failed
+    status = Column(Text, default="queued")  # queued, processing, done, failed
     row_count = Column(Integer, nullable=True)
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # 背景匯入的即時進度（每批寫入後更新，給 GET /api/customers/imports/{id} 輪詢）
+    rows_parsed = Column(Integer, default=0)
+    rows_written = Column(Integer, default=0)
+    inserted = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    unchanged = Column(Integer, default=0)  # delta 模式略過的筆數
+    bytes_total = Column(BigInteger, nullable=True)
+    bytes_read = Column(BigInteger, default=0)
+    rows_per_sec = Column(Float, nullable=True)
+    eta_seconds = Column(Float, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
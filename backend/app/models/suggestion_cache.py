@@ -0,0 +1,15 @@
+from datetime import datetime
+from sqlalchemy import String, Text, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+class SuggestionCacheEntry(Base):
+    __tablename__ = "suggestion_cache"
+
+    # sha256(正規化後的 payload + provider + prompt 版本)
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    customer_code: Mapped[str] = mapped_column(String(50), index=True)
+    suggestion_json: Mapped[str] = mapped_column(Text)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
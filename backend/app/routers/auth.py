@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import select
-from app.core.db import get_db
-from app.core.security import hash_password, verify_password, create_access_token, decode_token
+from app.core import auth_cache
+from app.core.passwords import hash_password_async, verify_password_async
+from app.core.auth_cache import AuthUser
+from app.core.db import get_session, run_db
+from app.core.security import create_access_token, decode_token
 from app.models.user import User
 from app.schemas.auth import RegisterRequest, LoginRequest, TokenResponse
 from app.schemas.user import UserOut
@@ -11,44 +14,75 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 bearer = HTTPBearer(auto_error=False)
 
-@router.post("/register", response_model=UserOut)
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
-    existing = db.scalar(select(User).where(User.email == payload.email))
-    if existing:
-        raise HTTPException(status_code=409, detail="Email already registered")
+# DB 存取都經過 run_db()（async engine 或 threadpool，見 app/core/db.py）；
+# bcrypt 是 CPU-bound，丟到專用 process pool（app/core/passwords.py），不佔 threadpool 也不卡 event loop
+
+def _get_user_by_email(db: Session, email: str) -> User | None:
+    return db.scalar(select(User).where(User.email == email))
 
-    user = User(email=payload.email, password_hash=hash_password(payload.password))
+def _add_user(db: Session, user: User) -> User:
     db.add(user)
     db.commit()
     db.refresh(user)
+    return user
+
+def _update_password_hash(db: Session, user: User, password_hash: str) -> None:
+    user.password_hash = password_hash
+    db.commit()
+
+@router.post("/register", response_model=UserOut)
+async def register(payload: RegisterRequest, db: Session = Depends(get_session)):
+    existing = await run_db(db, _get_user_by_email, payload.email)
+    if existing:
+        raise HTTPException(status_code=409, detail="Email already registered")
+
+    password_hash = await hash_password_async(payload.password)
+    user = await run_db(db, _add_user, User(email=payload.email, password_hash=password_hash))
     return UserOut(id=user.id, email=user.email)
 
 @router.post("/login", response_model=TokenResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = db.scalar(select(User).where(User.email == payload.email))
-    if not user or not verify_password(payload.password, user.password_hash):
+async def login(payload: LoginRequest, db: Session = Depends(get_session)):
+    user = await run_db(db, _get_user_by_email, payload.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    ok, new_hash = await verify_password_async(payload.password, user.password_hash)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # BCRYPT_ROUNDS 改過：用新 cost 重算的 hash 寫回去，使用者無感
+        await run_db(db, _update_password_hash, user, new_hash)
 
     token = create_access_token(sub=str(user.id))
     return TokenResponse(access_token=token)
 
-def get_current_user(
+async def get_current_user(
     creds: HTTPAuthorizationCredentials | None = Depends(bearer),
-    db: Session = Depends(get_db),
-) -> User:
+    db: Session = Depends(get_session),
+) -> AuthUser:
+    """
+    快速路徑（app/core/auth_cache.py）：驗過的 token 與使用者身分都有快取，
+    命中時不驗簽章也不查 DB（Session 沒用到就不會拿連線）。
+    """
     if not creds:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    try:
-        payload = decode_token(creds.credentials)
-        user_id = int(payload["sub"])
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    token = creds.credentials
+    user_id = auth_cache.get_token_user_id(token)
+    if user_id is None:
+        try:
+            payload = decode_token(token)
+            user_id = int(payload["sub"])
+        except Exception:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        auth_cache.put_token(token, user_id, payload.get("exp"))
 
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+    user = auth_cache.get_user(user_id)
+    if user is None:
+        row = await run_db(db, Session.get, User, user_id)
+        if not row:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = auth_cache.put_user(row)
     return user
 
 @router.get("/me", response_model=UserOut)
-def me(user: User = Depends(get_current_user)):
+async def me(user: AuthUser = Depends(get_current_user)):
     return UserOut(id=user.id, email=user.email)
@@ -1,273 +1,239 @@
+import asyncio
+import base64
 import csv
-import io
+import json
+import os
+import shutil
+import tempfile
 import uuid
 import traceback
 from datetime import date
 from typing import List
 
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import select, desc, func, or_, and_, not_
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, desc, func, or_, and_
 
-from app.core.db import get_db
+from app.core.db import get_read_session, get_session, run_db
 from app.models.customer import Customer
+from app.models.customer_stats import CustomerRollup
 from app.models.import_record import ImportRecord
-from app.schemas.customer import CustomerOut, ImportResult, CustomerList
+from app.schemas.customer import CustomerOut, ImportResult, CustomerList, CustomerStats, FollowupBatchRequest
 from app.schemas.import_record import ImportRecordOut
-from app.core.llm_service import generate_followup_suggestion
+from app.core.llm_service import generate_followup_suggestion, generate_followup_suggestions, stream_followup_suggestion
+from app.core import customer_stats
+from app.core.count_cache import count_key, estimate_count, get_cached_count, invalidate_counts, set_cached_count
+from app.core.columnar import detect_format, require_pyarrow
+from app.core.exporter import FORMATS, iter_export
+from app.core.importer import CHUNK_SIZE, submit_import
+from app.core.risk import (
+    churn_rule, ensure_risk_fresh, format_risk_reason, is_risk_stale, refresh_risk_tiers, stale_risk_condition,
+)
+from app.core.risk_rules import RISK_LEVELS, get_rule_set
 
 router = APIRouter(prefix="/api/customers", tags=["customers"])
 
-REQUIRED_COLUMNS = {
-    "customer_code",
-    "last_visit_date",
-    "total_spent",
-    "visit_count",
-    "membership_type",
-}
-
-def _to_int(v: str, field: str) -> int:
-    try:
-        return int(float(v))
-    except Exception:
-        if not v: return 0
-        raise HTTPException(status_code=422, detail=f"Invalid int for {field}: {v}")
-
-def _to_date(v: str, field: str) -> date:
-    try:
-        if not v: raise ValueError("Empty date")
-        return date.fromisoformat(v)
-    except Exception:
-        raise HTTPException(status_code=422, detail=f"Invalid date for {field} (YYYY-MM-DD): {v}")
-
 @router.post("/import", response_model=ImportResult)
 async def import_customers_csv(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    background: bool = True,
+    delta: bool = True,
+    db: Session = Depends(get_session),
 ):
-    from app.core.config import settings
-    # print(f"DEBUG: Starting import_customers_csv... DB_URL_FROM_SETTINGS={settings.DATABASE_URL}", flush=True)
-    # print(f"DEBUG: Session bind URL={db.bind.url}", flush=True)
-
-    try:
-        # 1. Start Import Record
+    """
+    預設丟到背景 worker，立即回傳 import_id（status="queued"），
+    進度請輪詢 GET /api/customers/imports/{import_id}。
+    background=false 時在這個請求內跑完並回傳最終結果。
+    delta=true（預設）時內容沒變的客戶不重寫（計入 unchanged）；delta=false 強制全部重新 upsert。
+    """
+    fmt = detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Please upload a .csv, .parquet or .arrow file")
+
+    # 1. Start Import Record
+    def _create_record(db: Session) -> ImportRecord:
         import_rec = ImportRecord(
             filename=file.filename,
-            status="processing",
+            status="queued",
             row_count=0
         )
         db.add(import_rec)
         db.commit()
         db.refresh(import_rec)
+        return import_rec
 
-        if not file.filename.lower().endswith(".csv"):
-            raise HTTPException(status_code=400, detail="Please upload a .csv file")
+    import_rec = await run_db(db, _create_record)
 
-        raw = await file.read()
-        text_content = raw.decode("utf-8-sig", errors="replace")
+    # 2. 上傳內容先存成暫存檔（UploadFile 在請求結束後就會關閉）
+    def _spool() -> str:
+        with tempfile.NamedTemporaryFile(prefix="import_", suffix=os.path.splitext(file.filename)[1], delete=False) as tmp:
+            shutil.copyfileobj(file.file, tmp, CHUNK_SIZE)
+            return tmp.name
 
-        reader = csv.DictReader(io.StringIO(text_content))
-        
-        if not reader.fieldnames:
-             raise HTTPException(status_code=400, detail="CSV has no header")
-
-        rows_to_upsert = []
-        row_idx = 0
-        for row in reader:
-            row_idx += 1
-            code = row.get("customer_code") or row.get("customer_id")
-            if not code:
-                continue 
-
-            r_data = {
-                "customer_code": code.strip(),
-                "last_visit_date": _to_date((row.get("last_visit_date") or "").strip(), f"Row {row_idx} date"),
-                "total_spent": _to_int((row.get("total_spent") or "").strip(), f"Row {row_idx} spent"),
-                "visit_count": _to_int((row.get("visit_count") or "").strip(), f"Row {row_idx} visit"),
-                "membership_type": (row.get("membership_type") or "BASIC").strip(),
-                "created_at": date.today()
-            }
-            rows_to_upsert.append(r_data)
-
-        if not rows_to_upsert:
-             import_rec.status = "done"
-             import_rec.row_count = 0
-             db.commit()
-             return ImportResult(import_id=str(import_rec.id), inserted=0, updated=0, total_rows=0)
-
-        # 2. Logic to count Insert vs Update
-        codes = [x["customer_code"] for x in rows_to_upsert]
-        existing_codes = db.scalars(
-            select(Customer.customer_code).where(Customer.customer_code.in_(codes))
-        ).all()
-        existing_set = set(existing_codes)
-
-        update_count = 0
-        insert_count = 0
-        for r in rows_to_upsert:
-            if r["customer_code"] in existing_set:
-                update_count += 1
-            else:
-                insert_count += 1
-
-        # 3. Bulk Upsert (Raw SQL)
-        # Using raw SQL to avoid SQLAlchemy dialect compilation issues (SQLite vs Postgres confusion)
-        from sqlalchemy import text
-        stmt = text("""
-            INSERT INTO customers (customer_code, last_visit_date, total_spent, visit_count, membership_type, created_at)
-            VALUES (:customer_code, :last_visit_date, :total_spent, :visit_count, :membership_type, :created_at)
-            ON CONFLICT (customer_code) DO UPDATE 
-            SET last_visit_date = EXCLUDED.last_visit_date,
-                total_spent = EXCLUDED.total_spent,
-                visit_count = EXCLUDED.visit_count,
-                membership_type = EXCLUDED.membership_type
-        """)
-        
-        # Execute each (or executemany if driver supports it efficiently)
-        # SQLAlchemy execute(text, list_of_dicts) does executemany
-        db.execute(stmt, rows_to_upsert)
-        print("DEBUG: Raw SQL Upsert executed.", flush=True)
-        
-        # 4. Finish Import Record
-        import_rec.status = "done"
-        import_rec.row_count = len(rows_to_upsert)
-        db.commit()
+    path = await run_in_threadpool(_spool)
 
+    # 3. 解析與寫入都在匯入專用的 worker pool（app/core/importer.py），event loop 只負責等結果
+    job = submit_import(import_rec.id, path, fmt, delta)
+    if background:
         return ImportResult(
             import_id=str(import_rec.id),
-            inserted=insert_count,
-            updated=update_count,
-            total_rows=len(rows_to_upsert)
+            status=import_rec.status,
+            inserted=0,
+            updated=0,
+            unchanged=0,
+            total_rows=0,
         )
 
+    try:
+        return await asyncio.wrap_future(job)
     except HTTPException:
         raise
-    except Exception as e:
-        db.rollback()
-        err_msg = traceback.format_exc()
-        print(f"Import Error: {err_msg}", flush=True)
-        # Try to save failed status (best effort)
-        try:
-             # Need a new transaction?
-             # Since we are inside a request, and rolled back, `import_rec` is gone/detached.
-             # We won't try to update `import_rec` to avoid complexity here.
-             pass 
-        except:
-             pass
-        raise HTTPException(status_code=500, detail=f"Import failed: {err_msg}")
+    except Exception:
+        raise HTTPException(status_code=500, detail=f"Import failed: {traceback.format_exc()}")
 
+# 匯入紀錄 / 進度要讀到剛寫入的狀態，不走 replica
 @router.get("/imports", response_model=List[ImportRecordOut])
-def get_imports(limit: int = 20, db: Session = Depends(get_db)):
-    return db.scalars(
-        select(ImportRecord).order_by(desc(ImportRecord.created_at)).limit(limit)
-    ).all()
-
-
-def _churn_rule(membership_type: str, days_since: int) -> tuple[str, str]:
-    m = (membership_type or "").upper()
-    if m == "VIP":
-        if days_since >= 150:
-            return "high", f"VIP 已停滯 {days_since} 天 (>=150)"
-        if days_since >= 90:
-            return "medium", f"VIP 已停滯 {days_since} 天 (>=90)"
-        return "low", f"VIP 近期活躍 ({days_since} 天前)"
-    if days_since >= 120:
-        return "high", f"已停滯 {days_since} 天 (>=120)"
-    if days_since >= 60:
-        return "medium", f"已停滯 {days_since} 天 (>=60)"
-    return "low", f"近期活躍 ({days_since} 天前)"
+async def get_imports(limit: int = 20, db: Session = Depends(get_session)):
+    query = select(ImportRecord).order_by(desc(ImportRecord.created_at)).limit(limit)
+    return await run_db(db, lambda s: s.scalars(query).all())
+
+@router.get("/imports/{import_id}", response_model=ImportRecordOut)
+async def get_import(import_id: uuid.UUID, db: Session = Depends(get_session)):
+    rec = await run_db(db, Session.get, ImportRecord, import_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return rec
 
 
+def _apply_filters(query, membership_type: str | None, risk_level: str | None):
+    # 1. Apply Membership Filter
+    if membership_type and membership_type != "all":
+        # Fuzzy match or exact? Assuming exact from UI but let's be safe
+        query = query.where(Customer.membership_type == membership_type)
+
+    # 2. Apply Risk Filter
+    # risk_level 已預先算好並建 index（見 app/core/risk.py），存的值還有效時只是一般的 index lookup；
+    # 還沒算過、已跨過門檻或是舊版規則算的 row（refresh 還沒跑完）改用規則編譯出的 SQL predicate 以今天判斷，
+    # 與列表顯示（is_risk_stale 時用 churn_rule）一致
+    if risk_level and risk_level != "all":
+        if risk_level in RISK_LEVELS:
+            today = date.today()
+            rules = get_rule_set()
+            stale = stale_risk_condition(today, rules.version)
+            query = query.where(or_(
+                and_(
+                    Customer.risk_level == risk_level,
+                    or_(Customer.risk_changes_on.is_(None), Customer.risk_changes_on > today),
+                    Customer.risk_version == rules.version,
+                ),
+                and_(stale, rules.sql_predicate(risk_level, today)),
+            ))
+        else:
+            query = query.where(Customer.risk_level == risk_level)
+    return query
+
+def _encode_cursor(c: Customer) -> str:
+    raw = json.dumps([c.customer_code, c.id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(token: str) -> tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        code, cid = json.loads(raw)
+        return str(code), int(cid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("", response_model=CustomerList)
-def list_customers(
+async def list_customers(
     limit: int = 100,
     offset: int = 0,
+    after: str | None = None,
+    include_total: bool = True,
+    exact: bool = True,
     membership_type: str | None = None,
     risk_level: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_session),
 ):
+    """
+    兩種分頁方式：
+    - offset：原本的 limit/offset（深頁會越來越慢）
+    - cursor：帶上一頁回傳的 next_cursor 當 after=，用 (customer_code, id) keyset 直接跳到下一頁，
+      第幾頁都一樣快；不需要總數時可以 include_total=false 省掉 count(*)
+
+    total 會快取（依 membership_type × risk_level × 日期，匯入完成後失效）；
+    exact=false 時允許回傳過期快取或 Postgres 統計估計值（total_is_estimate=true）
+    """
+    return await run_db(
+        db, _list_customers, limit, offset, after, include_total, exact, membership_type, risk_level,
+    )
+
+def _list_customers(
+    db: Session,
+    limit: int,
+    offset: int,
+    after: str | None,
+    include_total: bool,
+    exact: bool,
+    membership_type: str | None,
+    risk_level: str | None,
+) -> CustomerList:
     limit = max(1, min(limit, 500))
-    
-    query = select(Customer)
-    
-    # 1. Apply Membership Filter
-    if membership_type and membership_type != "all":
-        # Fuzzy match or exact? Assuming exact from UI but let's be safe
-        query = query.where(Customer.membership_type == membership_type)
-
-    # 2. Apply Risk Filter (Logic -> Date)
-    if risk_level and risk_level != "all":
-        from datetime import timedelta
-        today = date.today()
-        # Risk thresholds
-        # VIP: High(>=150), Med(90-149), Low(<90)
-        # Normal: High(>=120), Med(60-119), Low(<60)
-        
-        # We need OR logic: (VIP AND High_Cond) OR (NOT VIP AND High_Cond)
-        from sqlalchemy import or_, and_, not_
-
-        is_vip = (func.upper(Customer.membership_type) == "VIP")
-        
-        if risk_level == "high":
-            # VIP >= 150  OR  Not VIP >= 120
-            # date <= today - 150
-            d_vip = today - timedelta(days=150)
-            d_norm = today - timedelta(days=120)
-            
-            query = query.where(
-                or_(
-                    and_(is_vip, Customer.last_visit_date <= d_vip),
-                    and_(not_(is_vip), Customer.last_visit_date <= d_norm)
-                )
-            )
-        elif risk_level == "medium":
-            # VIP: 90 <= days < 150  -->  today-149 <= date <= today-90
-            d_vip_start = today - timedelta(days=90)
-            d_vip_end = today - timedelta(days=149) # actually date >= today-149 implies days <= 149
-            
-            # Normal: 60 <= days < 120
-            d_norm_start = today - timedelta(days=60)
-            d_norm_end = today - timedelta(days=119)
-            
-            query = query.where(
-                or_(
-                    and_(is_vip, Customer.last_visit_date <= d_vip_start, Customer.last_visit_date >= d_vip_end),
-                    and_(not_(is_vip), Customer.last_visit_date <= d_norm_start, Customer.last_visit_date >= d_norm_end)
-                )
-            )
-        elif risk_level == "low":
-             # VIP < 90 --> date > today-90
-             d_vip = today - timedelta(days=90)
-             d_norm = today - timedelta(days=60)
-             
-             query = query.where(
-                or_(
-                    and_(is_vip, Customer.last_visit_date > d_vip),
-                    and_(not_(is_vip), Customer.last_visit_date > d_norm)
-                )
-             )
+    ensure_risk_fresh()
 
+    membership_type = membership_type if membership_type != "all" else None
+    risk_level = risk_level if risk_level != "all" else None
+    query = _apply_filters(select(Customer), membership_type, risk_level)
 
     # 3. Get Total (with filters)
     # We must compile the query for count separately or use distinct technique
     # count_query = select(func.count()).select_from(query.subquery()) # generic way
     # Or simpler:
-    count_query = select(func.count(Customer.id)).where(query.whereclause) if query.whereclause is not None else select(func.count(Customer.id))
-    
-    total = db.scalar(count_query) or 0
+    total = None
+    total_is_estimate = False
+    if include_total:
+        key = count_key(membership_type, risk_level)
+        total = get_cached_count(key)
+        if total is None and not exact:
+            total = get_cached_count(key, allow_stale=True)
+            if total is None:
+                total = estimate_count(db, query.whereclause)
+            total_is_estimate = total is not None
+        if total is None:
+            count_query = select(func.count(Customer.id)).where(query.whereclause) if query.whereclause is not None else select(func.count(Customer.id))
+            total = db.scalar(count_query) or 0
+            set_cached_count(key, total)
 
     # 4. Get Rows (Apply sorting and pagination)
-    rows = db.execute(
-        query.order_by(Customer.customer_code).limit(limit).offset(offset)
-    ).scalars().all()
+    query = query.order_by(Customer.customer_code, Customer.id)
+    if after:
+        after_code, after_id = _decode_cursor(after)
+        query = query.where(or_(
+            Customer.customer_code > after_code,
+            and_(Customer.customer_code == after_code, Customer.id > after_id),
+        ))
+    else:
+        query = query.offset(offset)
+
+    # 多拿一筆來判斷還有沒有下一頁
+    rows = db.execute(query.limit(limit + 1)).scalars().all()
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
 
     today = date.today()
+    version = get_rule_set().version
     items: list[CustomerOut] = []
 
     for c in rows:
         days_since = (today - c.last_visit_date).days
-        risk_level_calc, risk_reason = _churn_rule(c.membership_type, days_since)
+        if is_risk_stale(c, today, version):
+            # 還沒被 refresh 到（其他 worker 剛寫入、今天剛跨過門檻、規則改版）：以今天即時判斷
+            risk_level_calc, risk_reason = churn_rule(c.membership_type, days_since)
+        else:
+            risk_level_calc = c.risk_level
+            risk_reason = format_risk_reason(c.membership_type, c.risk_level, days_since)
         items.append(
             CustomerOut(
                 id=c.id,
@@ -281,17 +247,59 @@ def list_customers(
                 risk_reason=risk_reason,
             )
         )
-    return CustomerList(items=items, total=total)
+    return CustomerList(items=items, total=total, total_is_estimate=total_is_estimate, next_cursor=next_cursor)
 
-@router.post("/{customer_id}/followup_suggestion")
-def followup_suggestion(customer_id: int, db: Session = Depends(get_db)):
-    c = db.query(Customer).filter(Customer.id == customer_id).first()
-    if not c:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    today = date.today()
+@router.get("/export")
+async def export_customers(
+    format: str = "csv",
+    gzip: bool = False,
+    include_reason: bool = True,
+    membership_type: str | None = None,
+    risk_level: str | None = None,
+    db: Session = Depends(get_read_session),
+):
+    """
+    一次串流匯出全部（或篩選後）客戶與風險分數，篩選條件同 GET /api/customers。
+    format=csv|ndjson|parquet；gzip=true 回傳 .gz（parquet 本身已壓縮，不適用）；
+    include_reason=false 可省掉 risk_reason 欄位（更快）
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}. Use one of: {', '.join(FORMATS)}")
+    if gzip and format == "parquet":
+        raise HTTPException(status_code=400, detail="gzip is not supported for parquet (already compressed)")
+    if format == "parquet":
+        require_pyarrow()  # 開始串流後就沒辦法再回錯誤狀態碼了
+    ensure_risk_fresh()
+    where = _apply_filters(select(Customer), membership_type, risk_level).whereclause
+
+    media_type, ext = FORMATS[format]
+    filename = f"customers.{ext}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        iter_export(format, where=where, include_reason=include_reason, gzip=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.get("/stats", response_model=CustomerStats)
+async def customer_stats_summary(membership_type: str | None = None, db: Session = Depends(get_read_session)):
+    """
+    membership_type × risk_level × recency 的分布（人數、消費總額、消費 p50/p90）。
+    直接讀 customer_rollup 彙總表（匯入時增量更新），成本只跟群組數有關。
+    """
+    membership_type = membership_type if membership_type != "all" else None
+
+    def _stats(db: Session) -> dict:
+        ensure_risk_fresh()
+        return customer_stats.get_stats(db, membership_type)
+
+    return await run_db(db, _stats)
+
+def _suggestion_payload(c: Customer, today: date) -> dict:
     days_since = (today - c.last_visit_date).days
-    risk_level, risk_reason = _churn_rule(c.membership_type, days_since)
-    payload = {
+    risk_level, risk_reason = churn_rule(c.membership_type, days_since)
+    return {
         "customer_id": c.id,
         "customer_code": c.customer_code,
         "membership_type": c.membership_type,
@@ -301,10 +309,83 @@ def followup_suggestion(customer_id: int, db: Session = Depends(get_db)):
         "risk_level": risk_level,
         "risk_reason": risk_reason,
     }
-    return generate_followup_suggestion(payload)
+
+@router.post("/{customer_id}/followup_suggestion")
+async def followup_suggestion(customer_id: int, db: Session = Depends(get_session)):
+    c = await run_db(db, Session.get, Customer, customer_id)
+    if not c:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return await generate_followup_suggestion(_suggestion_payload(c, date.today()))
+
+@router.post("/{customer_id}/followup_suggestion/stream")
+async def followup_suggestion_stream(customer_id: int, db: Session = Depends(get_session)):
+    """
+    Server-Sent Events 版本：模型一邊產生，一邊依區塊送出
+      event: delta  data: {"section": "summary", "text": "..."}
+      event: done   data: <完整建議，同非串流版本>
+      event: error  data: {"detail": "..."}
+    """
+    c = await run_db(db, Session.get, Customer, customer_id)
+    if not c:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    payload = _suggestion_payload(c, date.today())
+
+    def _sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def _events():
+        try:
+            async for event, data in stream_followup_suggestion(payload):
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        # 避免 proxy（nginx / Render）把整段 buffer 起來才送
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/followup_suggestions")
+async def followup_suggestions_batch(body: FollowupBatchRequest, db: Session = Depends(get_session)):
+    """
+    批次產生跟進建議，以 NDJSON 串流回傳（每完成一筆就送出一行）：
+    {"customer_id": 1, "ok": true, "suggestion": {...}} / {"customer_id": 2, "ok": false, "error": "..."}
+    customer_ids 裡不存在的 id 也會各回一行 ok=false（"Customer not found"），不會默默少掉。
+    """
+    limit = max(1, min(body.limit, 5000))
+    if body.customer_ids is not None:
+        query = select(Customer).where(Customer.id.in_(body.customer_ids[:limit]))
+    else:
+        query = _apply_filters(select(Customer), body.membership_type, body.risk_level).limit(limit)
+
+    def _load(db: Session) -> list[Customer]:
+        if body.customer_ids is None:
+            ensure_risk_fresh()
+        return db.scalars(query.order_by(Customer.id)).all()
+
+    customers = await run_db(db, _load)
+    today = date.today()
+    payloads = [_suggestion_payload(c, today) for c in customers]
+    found = {c.id for c in customers}
+    missing = [] if body.customer_ids is None else [
+        cid for cid in dict.fromkeys(body.customer_ids[:limit]) if cid not in found
+    ]
+
+    async def _ndjson():
+        for cid in missing:
+            yield json.dumps({"customer_id": cid, "ok": False, "error": "Customer not found"}) + "\n"
+        async for result in generate_followup_suggestions(payloads):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
 
 @router.post("/load_demo_data")
-def load_demo_data(db: Session = Depends(get_db)):
+async def load_demo_data(db: Session = Depends(get_session)):
+    return await run_db(db, _load_demo_data)
+
+def _load_demo_data(db: Session) -> dict:
     from pathlib import Path
     base_dir = Path(__file__).resolve().parent.parent.parent
     csv_path = base_dir / "data" / "demo_customers.csv"
@@ -313,6 +394,7 @@ def load_demo_data(db: Session = Depends(get_db)):
     if not csv_path.exists():
         raise HTTPException(status_code=404, detail=f"Demo CSV not found")
     db.query(Customer).delete()
+    db.query(CustomerRollup).delete()  # refresh_risk_tiers 會把新資料加回彙總表
     with open(csv_path, "r", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
         for row in reader:
@@ -327,4 +409,6 @@ def load_demo_data(db: Session = Depends(get_db)):
              )
              db.add(c)
     db.commit()
+    refresh_risk_tiers(db)
+    invalidate_counts()
     return {"ok": True, "rows": 999}
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from datetime import date
 from pydantic import BaseModel
 
@@ -22,10 +22,35 @@ class CustomerOut(BaseModel):
 
 class CustomerList(BaseModel):
     items: List[CustomerOut]
-    total: int
+    total: Optional[int]  # include_total=false 時為 None
+    total_is_estimate: bool = False  # exact=false 時可能是估計值
+    next_cursor: Optional[str] = None  # 下一頁請帶 after=<next_cursor>
+
+class CustomerStatsGroup(BaseModel):
+    membership_type: str
+    risk_level: str
+    recency_bucket: str  # 依最後來店月份距今：0-1m / 1-3m / 3-6m / 6-12m / 12m+
+    customers: int
+    total_spent: int
+    spent_p50: Optional[float]  # 由消費級距直方圖估算
+    spent_p90: Optional[float]
+
+class CustomerStats(BaseModel):
+    groups: List[CustomerStatsGroup]
+    total_customers: int
+    total_spent: int
 
 class ImportResult(BaseModel):
     import_id: str
+    status: str = "done"  # 背景匯入時為 "queued"，數字請改輪詢 /imports/{id}
     inserted: int
     updated: int
+    unchanged: int = 0  # delta 模式下內容沒變、沒有寫入的筆數
     total_rows: int
+
+class FollowupBatchRequest(BaseModel):
+    # 二擇一：直接給 customer_ids，或用篩選條件（同 GET /api/customers）
+    customer_ids: Optional[List[int]] = None
+    membership_type: Optional[str] = None
+    risk_level: Optional[str] = None
+    limit: int = 1000
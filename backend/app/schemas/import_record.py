@@ -11,5 +11,18 @@ class ImportRecordOut(BaseModel):
     error_message: Optional[str]
     created_at: datetime
 
+    # progress
+    rows_parsed: Optional[int] = None
+    rows_written: Optional[int] = None
+    inserted: Optional[int] = None
+    updated: Optional[int] = None
+    unchanged: Optional[int] = None
+    bytes_total: Optional[int] = None
+    bytes_read: Optional[int] = None
+    rows_per_sec: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
     class Config:
         from_attributes = True
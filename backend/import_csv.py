@@ -1,7 +1,15 @@
 import os
-import pandas as pd
+import sys
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core import customer_stats
+from app.core.bulk_load import get_bulk_loader
+from app.core.columnar import ColumnarReader, detect_format
+from app.core.importer import iter_text_lines, iter_customer_rows, iter_batches, write_batch
 
 load_dotenv()
 
@@ -15,45 +23,40 @@ engine = create_engine(DATABASE_URL)
 
 def import_csv_to_customers(csv_path: str):
     print(f"Reading CSV from: {csv_path}")
-    df = pd.read_csv(csv_path)
-
-    # 確保欄位名稱對應 Customer model
-    # CSV: customer_code, membership_type, total_spent, visit_count, last_visit_date
-    # DB:  customer_code, membership_type, total_spent, visit_count, last_visit_date, created_at...
-
-    with engine.begin() as conn:
-        # 先清除舊資料（可選，看需求）
-        # conn.execute(text("DELETE FROM customers")) 
-
-        rows_inserted = 0
-        for _, row in df.iterrows():
-            # 使用 INSERT ON CONFLICT DO UPDATE (Upsert) 或是單純 INSERT
-            # 這裡示範簡單的 Insert，若 customer_code 重複則忽略
-            
-            stmt = text("""
-                INSERT INTO customers (customer_code, membership_type, total_spent, visit_count, last_visit_date, created_at)
-                VALUES (:code, :type, :spent, :count, :date, now())
-                ON CONFLICT (customer_code) DO UPDATE 
-                SET total_spent = EXCLUDED.total_spent,
-                    visit_count = EXCLUDED.visit_count,
-                    last_visit_date = EXCLUDED.last_visit_date
-            """)
-            
-            conn.execute(stmt, {
-                "code": row["customer_id"],
-                "type": row["membership_type"],
-                "spent": row["total_spent"],
-                "count": row["visit_count"],
-                "date": row["last_visit_date"]
-            })
-            rows_inserted += 1
-
-    print(f"✅ Successfully imported {rows_inserted} customers to Supabase!")
+    started = time.monotonic()
+
+    # 與 API 匯入共用同一套 streaming parser + bulk loader
+    # Postgres 走 COPY + staging table 合併；SQLite 走 multi-row VALUES
+    # 整份檔案在同一個 transaction 內，失敗就全部 rollback
+    # 與 API 一樣是 delta 模式：內容沒變的客戶不重寫
+    # rollup_writer：Postgres 上整個 transaction 期間 API 匯入 / 風險 refresh 會等這邊 commit（彙總表才不會重複扣）
+    inserted = updated = unchanged = 0
+    # .parquet / .arrow 走欄式讀取（app/core/columnar.py），不經過 CSV 文字解析
+    fmt = detect_format(csv_path) or "csv"
+    with open(csv_path, "rb") as f, Session(engine) as db, db.begin(), customer_stats.rollup_writer(db):
+        loader = get_bulk_loader(db)
+        if fmt == "csv":
+            batches = iter_batches(iter_customer_rows(iter_text_lines(f)), loader.batch_size)
+        else:
+            batches = ColumnarReader(csv_path, fmt).iter_batches(loader.batch_size)
+        for batch in batches:
+            ins, upd, same = write_batch(db, loader, batch)
+            inserted += ins
+            updated += upd
+            unchanged += same
+            print(f"  ... {inserted + updated + unchanged} rows", flush=True)
+
+    elapsed = time.monotonic() - started
+    print(f"✅ Successfully imported {inserted + updated + unchanged} customers "
+          f"(inserted={inserted}, updated={updated}, unchanged={unchanged}) in {elapsed:.1f}s")
 
 if __name__ == "__main__":
-    # 使用我們剛剛產生的 demo csv
-    csv_path = "data/demo_customers.csv"
+    # 使用我們剛剛產生的 demo csv（也可以從參數指定）
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/demo_customers.csv"
     if not os.path.exists(csv_path):
         print(f"Error: {csv_path} not found.")
     else:
-        import_csv_to_customers(csv_path)
+        try:
+            import_csv_to_customers(csv_path)
+        except HTTPException as e:
+            print(f"❌ {e.detail}")
@@ -1,146 +1,136 @@
+import argparse
 import csv
-import random
-from datetime import datetime, timedelta
+import io
+import os
+import sys
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
 
-# Config
-COUNT = 300
-TODAY = datetime(2026, 1, 29)
-OUTPUT_FILE = r"D:\InsightPilot\backend\data\customers.csv"
+import numpy as np
 
-# Targets
+# 合成客戶資料產生器（demo 資料、壓測 / benchmark 用）：
+#   python scripts/generate_csv.py --rows 300                      # 與原本 demo 檔相同的比例
+#   python scripts/generate_csv.py --rows 10000000 -o /tmp/10m.csv --seed 7
+#   python scripts/generate_csv.py --rows 100000 --membership VIP=0.3,Standard=0.5,Basic=0.2 --recency old=0.8,mid=0.1,recent=0.1
+# 同一個 seed + 參數一定產生同一份檔案；以 numpy 分塊產生、邊產生邊寫，1 千萬筆也不會吃光記憶體
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "customers.csv")
+CHUNK_ROWS = 200_000
+
+# 預設分布沿用原本 300 筆 demo 檔的目標比例
 # Membership: VIP 36, Standard 174, Basic 90
 # Recency: Recent(1-14) 60, Mid(15-90) 120, Old(91-365) 120
 # Spend: High(20k+) 30, Mid(5k-20k) 90, Low(<5k) 180
-
-def get_date(category):
-    if category == "recent":
-        days = random.randint(1, 14)
-    elif category == "mid":
-        days = random.randint(15, 90)
-    else: # old
-        days = random.randint(91, 365)
-    return (TODAY - timedelta(days=days)).strftime("%Y-%m-%d")
-
-def get_spend_visit(category):
-    if category == "high":
-        # 20k-80k, visits 20-30
-        spent = random.randint(20001, 80000)
-        visits = random.randint(20, 30)
-    elif category == "mid":
-        # 5k-20k, visits 10-20
-        spent = random.randint(5001, 20000)
-        visits = random.randint(10, 20)
-    else: # low
-        # 500-5000, visits 1-10
-        spent = random.randint(500, 5000)
-        visits = random.randint(1, 10)
-    
-    # Add noise to correlation
-    visits += random.choice([-1, 0, 1])
-    visits = max(1, min(30, visits))
-    return spent, visits
-
-# We build the list of 300 items by carefully allocating buckets to satisfy all constraints
-# Strategy: Intersect 3 Dimensions? Too hard.
-# Strategy: Assign Membership first, then fill slots for Spend/Recency based on likelihood.
-
-# Initialize slots
-# 300 slots.
-data = []
-
-# Allocations
-# High Spend (30): 30 VIP
-# Mid Spend (90): 6 VIP, 80 Std, 4 Basic
-# Low Spend (180): 0 VIP, 94 Std, 86 Basic
-# -- Checks --
-# VIP Total: 30+6+0 = 36 (OK)
-# Std Total: 0+80+94 = 174 (OK)
-# Basic Total: 0+4+86 = 90 (OK)
-# Spend Totals: 30 High, 90 Mid, 180 Low (OK)
-
-groups = []
-# Group 1: VIP + High Spend (30 items)
-groups.extend([{"m": "VIP", "s": "high"}] * 30)
-# Group 2: VIP + Mid Spend (6 items)
-groups.extend([{"m": "VIP", "s": "mid"}] * 6)
-# Group 3: Std + Mid Spend (80 items)
-groups.extend([{"m": "Standard", "s": "mid"}] * 80)
-# Group 4: Basic + Mid Spend (4 items)
-groups.extend([{"m": "Basic", "s": "mid"}] * 4)
-# Group 5: Std + Low Spend (94 items)
-groups.extend([{"m": "Standard", "s": "low"}] * 94)
-# Group 6: Basic + Low Spend (86 items)
-groups.extend([{"m": "Basic", "s": "low"}] * 86)
-
-# Now assign Recency (Recent 60, Mid 120, Old 120) to these 300 items
-# Heuristic: VIP/High Spend -> More Recent. Basic/Low -> More Old.
-
-# Available slots
-recency_slots = ["recent"] * 60 + ["mid"] * 120 + ["old"] * 120
-
-# We distribute them manually to groups to ensure realism
-# Group 1 (30 VIP/High): Take 20 Recent, 10 Mid
-g1_r = ["recent"]*20 + ["mid"]*10
-# Group 2 (6 VIP/Mid): Take 6 Recent
-g2_r = ["recent"]*6
-# Group 3 (80 Std/Mid): Take 80 Mid
-g3_r = ["mid"]*80
-# Group 4 (4 Basic/Mid): Take 4 Mid
-g4_r = ["mid"]*4
-# Remaining Needs: 
-# Total Used: Recent(26/60), Mid(94/120), Old(0/120)
-# Remaining Avail: Recent(34), Mid(26), Old(120)
-# Group 5 (94 Std/Low)
-# Group 6 (86 Basic/Low)
-# Assign remaining Recent(34) to Group 5 (Std/Low) -> "Churning soon?" or "New low tier"
-# Assign remaining Mid(26) to Group 5
-# Remaining 34 of Group 5 get Old.
-g5_r = ["recent"]*34 + ["mid"]*26 + ["old"]*34
-# Assign 86 Old to Group 6
-g6_r = ["old"]*86
-
-# Totals Check for G5/G6:
-# G5: 34+26+34 = 94. Correct.
-# G6: 86. Correct.
-# Overall: 
-# Recent: 20+6+34 = 60. OK.
-# Mid: 10+0+80+4+26 = 120. OK.
-# Old: 34+86 = 120. OK.
-
-# Merge Recency into Groups
-# Since groups were extended in order, we can map them back.
-# But python lists are just lists.
-all_recencies = g1_r + g2_r + g3_r + g4_r + g5_r + g6_r
-
-# Now generate actual data
-final_rows = []
-for i in range(300):
-    g = groups[i]
-    r_cat = all_recencies[i]
-    
-    cid = f"C{i+1:03d}"
-    m_type = g["m"]
-    
-    spent, visits = get_spend_visit(g["s"])
-    lvd = get_date(r_cat)
-    
-    final_rows.append([cid, lvd, spent, visits, m_type])
-
-# Shuffle rows so C001 isn't always VIP
-random.shuffle(final_rows)
-# Re-assign IDs to be sorted C001-C300 after shuffle?
-# "customer_id C001 ~ C300". Usually implies order.
-# Let's sort by ID to be neat, or just overwrite ID.
-# Overwriting ID is better to mix the types.
-final_rows.sort(key=lambda x: x[0]) # Start with C001...
-# Actually, if I shuffle, the list is mixed. I should re-label C001..C300
-for i in range(300):
-    final_rows[i][0] = f"C{i+1:03d}"
-
-# Write CSV
-with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["customer_id", "last_visit_date", "total_spent", "visit_count", "membership_type"])
-    writer.writerows(final_rows)
-
-print(f"Generated {COUNT} rows to {OUTPUT_FILE}")
+DEFAULT_MEMBERSHIP = {"VIP": 36, "Standard": 174, "Basic": 90}
+DEFAULT_RECENCY = {"recent": 60, "mid": 120, "old": 120}
+DEFAULT_SPEND = {"high": 30, "mid": 90, "low": 180}
+
+# 各級距的範圍（含兩端）
+RECENCY_DAYS = {"recent": (1, 14), "mid": (15, 90), "old": (91, 365)}
+SPEND_RANGES = {"high": (20001, 80000), "mid": (5001, 20000), "low": (500, 5000)}
+VISIT_RANGES = {"high": (20, 30), "mid": (10, 20), "low": (1, 10)}
+
+HEADER = ["customer_id", "last_visit_date", "total_spent", "visit_count", "membership_type"]
+
+
+def parse_weights(spec: Optional[str], default: Dict[str, float], allowed: Optional[List[str]] = None) -> Dict[str, float]:
+    """"VIP=0.2,Basic=0.8" -> {"VIP": 0.2, "Basic": 0.8}（會再正規化成總和 1）。"""
+    if not spec:
+        weights = dict(default)
+    else:
+        weights = {}
+        for part in spec.split(","):
+            name, _, value = part.partition("=")
+            name = name.strip()
+            if allowed is not None and name not in allowed:
+                raise ValueError(f"Unknown bucket '{name}', use one of: {', '.join(allowed)}")
+            weights[name] = float(value)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError(f"Weights must sum to > 0: {spec}")
+    return {k: v / total for k, v in weights.items()}
+
+def _pick(rng: np.random.Generator, weights: Dict[str, float], n: int) -> Tuple[List[str], np.ndarray]:
+    names = list(weights)
+    return names, rng.choice(len(names), size=n, p=list(weights.values()))
+
+def _uniform(rng: np.random.Generator, idx: np.ndarray, names: List[str], ranges: Dict[str, Tuple[int, int]]) -> np.ndarray:
+    lo = np.array([ranges[n][0] for n in names])[idx]
+    hi = np.array([ranges[n][1] for n in names])[idx]
+    return rng.integers(lo, hi + 1)
+
+def generate_chunks(
+    rows: int,
+    seed: int = 42,
+    today: Optional[date] = None,
+    membership: Optional[Dict[str, float]] = None,
+    recency: Optional[Dict[str, float]] = None,
+    spend: Optional[Dict[str, float]] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[Dict[str, np.ndarray]]:
+    """分塊產生欄位陣列：customer_id / last_visit_date（datetime64[D]）/ total_spent / visit_count / membership_type。"""
+    rng = np.random.default_rng(seed)
+    today = np.datetime64(today or date.today(), "D")
+    membership = membership or parse_weights(None, DEFAULT_MEMBERSHIP)
+    recency = recency or parse_weights(None, DEFAULT_RECENCY)
+    spend = spend or parse_weights(None, DEFAULT_SPEND)
+    width = max(3, len(str(rows)))
+
+    for start in range(0, rows, chunk_rows):
+        n = min(chunk_rows, rows - start)
+        m_names, m_idx = _pick(rng, membership, n)
+        r_names, r_idx = _pick(rng, recency, n)
+        s_names, s_idx = _pick(rng, spend, n)
+        visits = _uniform(rng, s_idx, s_names, VISIT_RANGES) + rng.integers(-1, 2, size=n)  # 與消費的相關性加一點雜訊
+        yield {
+            "customer_id": np.char.add("C", np.char.zfill(np.arange(start + 1, start + n + 1).astype(str), width)),
+            "last_visit_date": today - _uniform(rng, r_idx, r_names, RECENCY_DAYS).astype("timedelta64[D]"),
+            "total_spent": _uniform(rng, s_idx, s_names, SPEND_RANGES),
+            "visit_count": np.clip(visits, 1, 30),
+            "membership_type": np.array(m_names, dtype=object)[m_idx],
+        }
+
+def write_csv(path: str, rows: int, **kwargs) -> int:
+    """寫成 import API 吃的 CSV，回傳檔案大小（bytes）。"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for chunk in generate_chunks(rows, **kwargs):
+            buf = io.StringIO()
+            csv.writer(buf).writerows(zip(
+                chunk["customer_id"].tolist(),
+                chunk["last_visit_date"].astype(str).tolist(),
+                chunk["total_spent"].tolist(),
+                chunk["visit_count"].tolist(),
+                chunk["membership_type"].tolist(),
+            ))
+            f.write(buf.getvalue())
+    return os.path.getsize(path)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic customers CSV")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, default=None, help="YYYY-MM-DD（預設今天）")
+    parser.add_argument("--membership", help="例如 VIP=36,Standard=174,Basic=90")
+    parser.add_argument("--recency", help=f"{'/'.join(RECENCY_DAYS)} 的比例，例如 recent=1,mid=2,old=2")
+    parser.add_argument("--spend", help=f"{'/'.join(SPEND_RANGES)} 的比例，例如 high=1,mid=3,low=6")
+    args = parser.parse_args(argv)
+
+    try:
+        size = write_csv(
+            args.output,
+            args.rows,
+            seed=args.seed,
+            today=args.today,
+            membership=parse_weights(args.membership, DEFAULT_MEMBERSHIP),
+            recency=parse_weights(args.recency, DEFAULT_RECENCY, list(RECENCY_DAYS)),
+            spend=parse_weights(args.spend, DEFAULT_SPEND, list(SPEND_RANGES)),
+        )
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Generated {args.rows} rows ({size / 1024 / 1024:.1f} MB) to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
 import os
 import sys
+from typing import List
 
 # Add parent dir to path so we can import app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import Table, create_engine, inspect, text
 from app.core.config import settings
 from app.models.import_record import ImportRecord
 from app.models.customer import Customer # Ensures customer table is known
+from app.models.suggestion_cache import SuggestionCacheEntry  # noqa: F401
+from app.models.customer_stats import CustomerRollup  # noqa: F401
+
+def add_missing_columns(engine, table: Table, names: List[str]) -> None:
+    """
+    Add model columns that an older table is missing (works on Postgres and SQLite:
+    no ADD COLUMN IF NOT EXISTS, types are rendered by the engine's dialect).
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for name in names:
+            if name in existing:
+                continue
+            column = table.c[name]
+            ddl = f"{column.name} {column.type.compile(dialect=engine.dialect)}"
+            if column.default is not None and column.default.is_scalar:
+                ddl += f" DEFAULT {column.default.arg!r}"
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            print(f"  + {table.name}.{name}")
 
 def init_db():
     print(f"Connecting to DB: {settings.DATABASE_URL.split('@')[-1]}") # Mask password
@@ -29,5 +49,43 @@ def init_db():
             else:
                 print(f"⚠️ Warning: {e}")
 
+    # 3. Background import progress columns (imports table may predate them)
+    print("Ensuring progress columns on imports...")
+    add_missing_columns(engine, ImportRecord.__table__, [
+        "rows_parsed", "rows_written", "inserted", "updated", "unchanged",
+        "bytes_total", "bytes_read", "rows_per_sec", "eta_seconds", "started_at", "finished_at",
+    ])
+    print("✅ imports progress columns ready.")
+
+    # 4. Precomputed risk tier columns (filled by scripts/refresh_risk.py)
+    print("Ensuring risk columns on customers...")
+    add_missing_columns(engine, Customer.__table__, ["risk_level", "risk_changes_on", "risk_version"])
+    with engine.begin() as conn:
+        # CREATE INDEX IF NOT EXISTS works on both Postgres and SQLite
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customers_risk_level ON customers (risk_level)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customers_risk_changes_on ON customers (risk_changes_on)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_customers_risk_version ON customers (risk_version)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_customers_membership_upper_last_visit "
+            "ON customers (upper(membership_type), last_visit_date)"
+        ))
+    print("✅ customers risk columns ready.")
+
+    # 5. Row fingerprints for delta imports (NULL = treated as changed, filled by the next import)
+    print("Ensuring row_hash column on customers...")
+    add_missing_columns(engine, Customer.__table__, ["row_hash"])
+    print("✅ customers row_hash column ready.")
+
+    # 6. Dashboard rollup table (GET /api/customers/stats); backfill from existing customers
+    print("Rebuilding customer_rollup...")
+    from sqlalchemy.orm import Session
+    from app.core import customer_stats
+    from app.core.risk import refresh_risk_tiers
+    with Session(engine) as db:
+        refresh_risk_tiers(db)
+        customer_stats.rebuild(db)
+        db.commit()
+    print("✅ customer_rollup ready.")
+
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 本地測試用的 OpenAI 相容 stub：
+#   python scripts/llm_stub_server.py
+#   LLM_PROVIDER=openai LLM_BASE_URL=http://127.0.0.1:9000/v1 uvicorn app.main:app
+# STUB_DELAY_SECONDS 模擬模型延遲、STUB_FAIL_RATE 模擬 503 讓 retry 有事做
+
+DELAY = float(os.environ.get("STUB_DELAY_SECONDS", "0.5"))
+FAIL_RATE = float(os.environ.get("STUB_FAIL_RATE", "0"))
+
+app = FastAPI(title="LLM stub")
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(DELAY)
+    if random.random() < FAIL_RATE:
+        return JSONResponse({"error": "stub overloaded"}, status_code=503)
+
+    inputs = json.loads(body["messages"][-1]["content"])
+    code = inputs.get("customer_code", "UNKNOWN")
+    if body.get("stream"):
+        return StreamingResponse(_stream_tokens(inputs), media_type="text/event-stream")
+
+    content = {
+        "summary": f"[stub] {code} 已 {inputs.get('days_since_last_visit')} 天未回訪。",
+        "scripts": {
+            "line": f"[stub] {code} 您好，好久不見～",
+            "sms": f"[stub] {code} 您好，本週有回流優惠。",
+            "call": f"[stub] 您好，致電關心 {code} 的近況。",
+        },
+        "next_actions": ["[stub] 本週內聯繫"],
+        "tags": [inputs.get("risk_level", "low"), "stub"],
+    }
+    return {
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)}}],
+    }
+
+async def _stream_tokens(inputs: dict):
+    # 串流模式：依 @@區塊 輸出，每個 token 幾個字，模擬模型逐字吐
+    code = inputs.get("customer_code", "UNKNOWN")
+    text = (
+        f"@@summary\n[stub] {code} 已 {inputs.get('days_since_last_visit')} 天未回訪。\n"
+        f"@@line\n[stub] {code} 您好，好久不見～\n"
+        f"@@sms\n[stub] {code} 您好，本週有回流優惠。\n"
+        f"@@call\n[stub] 您好，致電關心 {code} 的近況。\n"
+        f"@@next_actions\n[stub] 本週內聯繫\n"
+        f"@@tags\n{inputs.get('risk_level', 'low')},stub\n"
+    )
+    for i in range(0, len(text), 4):
+        chunk = {"choices": [{"index": 0, "delta": {"content": text[i:i + 4]}}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(DELAY / 50)
+    yield "data: [DONE]\n\n"
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.environ.get("PORT", 9000)))
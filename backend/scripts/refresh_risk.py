@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.db import SessionLocal
+from app.core.risk import refresh_risk_tiers
+
+# 每日排程（cron / Render Cron Job）：只重算今天跨過風險門檻的客戶
+# 第一次執行會回填所有 risk_level 為 NULL 的舊資料
+def main():
+    db = SessionLocal()
+    try:
+        updated = refresh_risk_tiers(db)
+        print(f"✅ Refreshed risk tiers for {updated} customers.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
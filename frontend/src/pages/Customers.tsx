@@ -154,8 +154,13 @@ export default function CustomersPage() {
     setLoading(true);
     setStatus("Importing CSV...");
     try {
-      const r = await importCustomersCSV(file);
-      setStatus(`✅ Imported. inserted=${r.inserted}, updated=${r.updated}, total_rows=${r.total_rows}`);
+      const r = await importCustomersCSV(file, (rec) => {
+        if (rec.status === "processing") {
+          const eta = rec.eta_seconds != null ? `, ETA ${Math.ceil(rec.eta_seconds)}s` : "";
+          setStatus(`Importing CSV... ${rec.rows_written ?? 0} rows written${eta}`);
+        }
+      });
+      setStatus(`✅ Imported. inserted=${r.inserted}, updated=${r.updated}, unchanged=${r.unchanged}, total_rows=${r.total_rows}`);
 
       // 匯入後回到第一頁，並拉回第一頁資料
       setOffset(0);
@@ -184,7 +189,7 @@ export default function CustomersPage() {
       <div style={{ display: "flex", gap: 12, alignItems: "center", flexWrap: "wrap", marginBottom: 12 }}>
         <input
           type="file"
-          accept=".csv,text/csv"
+          accept=".csv,text/csv,.parquet,.arrow,.feather"
           onChange={(e) => setFile(e.target.files?.[0] ?? null)}
         />
         <button onClick={onImport} disabled={loading}>
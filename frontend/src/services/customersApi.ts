@@ -14,12 +14,62 @@ export type CustomerOut = {
 };
 
 export type ImportResult = {
+  import_id: string;
+  status: string;
   inserted: number;
   updated: number;
+  unchanged: number;
   total_rows: number;
 };
 
-export async function importCustomersCSV(file: File): Promise<ImportResult> {
+export type ImportRecord = {
+  id: string;
+  filename: string | null;
+  status: "queued" | "processing" | "done" | "failed";
+  row_count: number | null;
+  error_message: string | null;
+  rows_parsed: number | null;
+  rows_written: number | null;
+  inserted: number | null;
+  updated: number | null;
+  unchanged: number | null;
+  rows_per_sec: number | null;
+  eta_seconds: number | null;
+};
+
+export function getImport(importId: string) {
+  return apiFetch<ImportRecord>(`/api/customers/imports/${importId}`);
+}
+
+// 匯入改為背景 job：輪詢直到 done / failed
+async function waitForImport(
+  importId: string,
+  onProgress?: (rec: ImportRecord) => void
+): Promise<ImportResult> {
+  for (;;) {
+    const rec = await getImport(importId);
+    onProgress?.(rec);
+    if (rec.status === "done") {
+      return {
+        import_id: rec.id,
+        status: rec.status,
+        inserted: rec.inserted ?? 0,
+        updated: rec.updated ?? 0,
+        unchanged: rec.unchanged ?? 0,
+        total_rows: rec.row_count ?? 0,
+      };
+    }
+    if (rec.status === "failed") {
+      throw new Error(rec.error_message || "Import failed");
+    }
+    await new Promise((r) => setTimeout(r, 1000));
+  }
+}
+
+export async function importCustomersCSV(
+  file: File,
+  onProgress?: (rec: ImportRecord) => void
+): Promise<ImportResult> {
   const base = import.meta.env.VITE_API_BASE_URL ?? "http://localhost:8000";
   const url = `${base}/api/customers/import`;
 
@@ -42,7 +92,9 @@ export async function importCustomersCSV(file: File): Promise<ImportResult> {
     throw new Error(String(msg));
   }
 
-  return data as ImportResult;
+  const result = data as ImportResult;
+  if (result.status === "done") return result;
+  return waitForImport(result.import_id, onProgress);
 }
 
 export function listCustomers(params?: {